@@ -1,4 +1,6 @@
-import pygame, sys
+import pygame, sys, os, argparse, csv, time, json, threading, queue, math
+from collections import OrderedDict, deque
+from operator import itemgetter
 import pygame.locals
 import numpy as np
 
@@ -7,12 +9,27 @@ import numpy as np
 SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 600
 FPS = 60
+# simulation
+TICK_RATE = 60 # physics steps per second, independent of how fast frames are drawn
+TICK_MS = 1000 / TICK_RATE
+MAX_TICKS_PER_FRAME = 5 # a slow frame catches up at most this many steps instead of spiraling
+IDLE = True # False to keep drawing at FPS even when nothing on screen can change
+SCORE_DISPLAY_MS = 5000 # how long the score (or win) message stays up
 
 # text
 DISPLAY_SIZE = 80
 INFO_SIZE = 35
 SCORE_SIZE = 30
 TITLE_SIZE = 160
+TEXT_CACHE_SIZE = 64 # rendered text surfaces kept around
+DISPLAY_FONT = "krungthep"
+INFO_FONT = "kefa"
+SCORE_FONT = "menlo"
+TITLE_FONT = "bradleyhand"
+# where resolved font paths are remembered between runs, so the system font scan only happens when fonts change
+FONT_CACHE_FILE = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "soccer", "fonts.json")
+FONT_DIRS = ("/usr/share/fonts", "/usr/local/share/fonts", "~/.fonts", "~/.local/share/fonts", "/System/Library/Fonts",
+             "/Library/Fonts", "~/Library/Fonts", os.path.join(os.environ.get("WINDIR", "C:\\Windows"), "Fonts"))
 
 # colors
 GREEN = (0, 170, 0)
@@ -49,17 +66,51 @@ FRAG_COUNT = 16
 FRAG_MASS = 40
 FRAG_SIZE = 3
 FRAG_VEL = FPS * 0.25
-FRAG_LIFETIME = 120 # milliseconds
+FRAG_POOL_SIZE = FRAG_COUNT*8 # most fragments alive at once, further ones aren't spawned
+FRAG_LIFETIME = 7 # ticks (~120 milliseconds) - removed on the 8th step after spawning
+GRENADE_MODES = ("fragments", "impulse") # fragment bodies flying out, or one push applied to everything nearby
+GRENADE_MODE = "fragments"
 # glue powerup
 GLUE_SIZE = 50
 GLUE_FRICTION = 0.9
-GLUE_LIFE = 3 # rounds - is removed the moment the 3rd round begins (player moves)
+GLUE_CELL = 2 # pixels per cell of the friction field glues are drawn into
+GLUE_LIFE = 3 # rounds - is removed the moment the 3rd round begins (player moves), so it is tied to inputs, not time
 # physics
 MAX_VEL = FPS*0.2
 AIM_TWEAK = 10 # smaller number = less difference bt big aim and small aim
 FRICTION = 0.97
 FRICTION_COEFFICIENT = 0.15 # for collisions
 RESTITUTION = 0.8 # bounciness
+# collision solver
+SOLVER_TOLERANCE = 0.01 # stop once no pair overlaps by more than this many pixels
+SOLVER_ITERATIONS = 8 # give up after this many passes
+# physics backend
+PHYSICS_BACKEND = "auto" # "arrays" for numpy over all bodies, "scalar" for plain floats one body at a time, "auto" to pick by body count
+SCALAR_MAX_BODIES = 16 # "auto" steps worlds with up to this many bodies on the scalar backend, where numpy's per-call overhead dominates
+# broad phase
+BROAD_PHASE = "grid" # "grid" for the spatial hash, "brute" to check every pair (for validation)
+GRID_CELL = 2*PLAYER_SIZE # touching bodies are at most 2 of the biggest radius apart, so they share or neighbor a cell; fragments (FRAG_SIZE) are much smaller
+# continuous collision detection, for bodies that could skip past something between two steps
+CCD = True # False to only check positions at the end of each step (for validation)
+CCD_SPEED = 1 # bodies moving more than this many of their own radius in a step are swept (fragments always, the ball near MAX_VEL)
+CCD_SUBSTEPS = 4 # impacts followed per body per step, anything still hitting after that stops where it touches
+CCD_BOUNCES = 4 # wall bounces followed per body per substep
+CCD_SKIN = 0.01 # pixels a swept impact ends up overlapping by, so the solver treats it as touching
+# sleeping
+MOVING_SPEED = 0.001 # slower than this counts as stopped
+SLEEP_STEPS = 10 # steps a body has to stay stopped before it's put to sleep and skipped until something hits it
+# impulse grenades (GRENADE_MODE)
+BLAST_RADIUS = FRAG_VEL * FRAG_LIFETIME # about as far as fragments get before they expire
+BLAST_IMPULSE = PLAYER_MASS * MAX_VEL # at the center: a player flies off at full speed, lighter bodies are clamped to it
+BLAST_LINE_OF_SIGHT = True # bodies with another body between them and the blast are shielded
+# shot preview while aiming
+PREVIEW_STEPS = 90 # steps a shot is played out for (1.5 seconds)
+PREVIEW_BOUNCES = 3 # a path ends at this many bounces, off walls or bodies
+PREVIEW_TURN = 0.999 # a velocity turning further than this (cosine of the angle) in one step is a bounce
+PREVIEW_QUANTUM = 0.25 # aim is rounded to this many pixels per step (2.5 pixels of drag) for the cache
+PREVIEW_BUDGET = 4 # milliseconds a frame spends simulating, a longer preview is finished over the next frames
+PREVIEW_CACHE_SIZE = 256 # aims kept until the board changes
+PREVIEW_WIDTH = 2
 # buttons
 NUM_BUTTONS = 2
 ICON_SIZE = 64
@@ -68,8 +119,19 @@ BUTTON_Y = SCREEN_HEIGHT-Y_GAP/2-ICON_SIZE/2
 BUTTON_RECT = pygame.Rect(0, 0, ICON_SIZE, ICON_SIZE) # for powerups, drawn on a different surface
 # misc
 SELECTED_THICKNESS = 5
+ANTIALIAS = False # True for smooth edges on bodies and glue (their sprites are then alpha blended, a bit slower to blit)
+ANTIALIAS_SCALE = 4 # antialiased sprites are drawn this many times bigger, then scaled down
+SPRITE_KEY = (255, 0, 255) # colorkey for the corners of circle sprites, not a color anything is drawn in
+GLUE_LAYER, BODY_LAYER, SELECTED_LAYER = range(3) # drawCircles draws lower layers first
 SPAWNS = ((FIELD_WIDTH/5, FIELD_HEIGHT/3), (FIELD_WIDTH/5,FIELD_HEIGHT*2/3), (FIELD_WIDTH/3, FIELD_HEIGHT/2))
 WIN_SCORE = 3
+# profiler
+PROFILE_PHASES = ("ai", "input", "physics", "pairs", "collisions", "field", "objects", "buttons", "text", "display")
+SIM_PHASES = ("physics", "pairs", "collisions") # the ones timed on the MatchThread during a match
+PROFILE_COUNTERS = ("bodies", "pairs", "contacts", "iterations")
+PROFILE_WINDOW = 300 # frames the percentiles are taken over
+PROFILE_REFRESH = 30 # frames between overlay updates, so its text isn't re-rendered every frame
+PROFILE_SIZE = 13
 
 # strings
 GRENADE = "Grenade"
@@ -77,140 +139,451 @@ GLUE = "Glue"
 
 
 # ---------------------- define classes
+# holds the physical state of every body in contiguous arrays (one row per body),
+# so integration and wall handling run once for the whole field instead of per object
+class World:
+    def __init__(self, capacity=16, physics=PHYSICS_BACKEND):
+        self.n = 0 # number of rows in use
+        self.pos = np.zeros((capacity, 2), dtype=np.float64)
+        self.vel = np.zeros((capacity, 2), dtype=np.float64)
+        self.mass = np.zeros(capacity, dtype=np.float64)
+        self.size = np.zeros(capacity, dtype=np.float64) # radius of circle
+        self.moving = np.zeros(capacity, dtype=bool)
+        self.awake = np.zeros(capacity, dtype=bool) # asleep = skipped by step() and left out of sleeping pairs
+        self.still = np.zeros(capacity, dtype=np.int32) # steps in a row spent stopped
+        self.active = 0 # bodies awake
+        self.movingCount = 0 # bodies with moving set
+        self.bodies = [] # views, in row order
+        self.iterations = 0 # solver passes used on the last call to resolveCollisions
+        self.contacts = 0 # touching pairs it resolved, summed over passes
+        self.physics = physics # "arrays", "scalar" or "auto", see PHYSICS_BACKEND
+        self.chooseBackend()
+
+    def add(self, body, x: float, y: float, mass: float, size: float):
+        if self.n == len(self.mass): # out of rows, double the capacity
+            capacity = 2*len(self.mass)
+            for name in ("pos", "vel", "mass", "size", "moving", "awake", "still"):
+                old = getattr(self, name)
+                new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+                new[:self.n] = old[:self.n]
+                setattr(self, name, new)
+
+        i = self.n
+        self.pos[i] = x, y
+        self.vel[i] = 0
+        self.mass[i] = mass
+        self.size[i] = size
+        self.moving[i] = False
+        self.awake[i] = True
+        self.still[i] = 0
+        self.active += 1
+        self.bodies.append(body)
+        self.n += 1
+        self.chooseBackend()
+        return i
+
+    # the last row moves into the removed body's row, so nothing else shifts
+    def remove(self, body):
+        i, last = body.index, self.n-1
+        self.active -= int(self.awake[i])
+        self.movingCount -= int(self.moving[i])
+        if i != last:
+            for arr in (self.pos, self.vel, self.mass, self.size, self.moving, self.awake, self.still):
+                arr[i] = arr[last]
+            moved = self.bodies[last]
+            moved.index = i
+            self.bodies[i] = moved
+        self.bodies.pop()
+        body.index = -1
+        self.n = last
+        self.chooseBackend()
+
+    # the backend that moves and collides the bodies, for physics "auto" picked by how many there are
+    def chooseBackend(self):
+        physics = self.physics
+        if physics == "auto":
+            physics = "scalar" if self.n <= SCALAR_MAX_BODIES else "arrays"
+        self.backend = PHYSICS_BACKENDS[physics]
+
+    def anyMoving(self):
+        return self.movingCount > 0
+
+    # wakes the bodies in rows, eg. after they were hit or launched
+    def wake(self, rows):
+        rows = np.asarray(rows)
+        asleep = rows[~self.awake[rows]]
+        self.awake[asleep] = True
+        self.active += len(asleep)
+        self.still[rows] = 0
+
+    def sleep(self, rows: np.ndarray):
+        self.awake[rows] = False
+        self.vel[rows] = 0
+        self.active -= len(rows)
+
+    # sets moving for the bodies in rows from their velocity, keeping movingCount up to date
+    def updateMoving(self, rows):
+        vel = self.vel[rows]
+        moving = np.hypot(vel[..., 0], vel[..., 1]) > MOVING_SPEED
+        self.movingCount += int(np.count_nonzero(moving)) - int(np.count_nonzero(self.moving[rows]))
+        self.moving[rows] = moving
+
+    # row index pairs (i < j) that might be touching, in the same order a full pair scan would give
+    # pairs of two sleeping bodies are left out, they can't have moved into each other
+    def candidatePairs(self, method=None):
+        if method is None:
+            method = BROAD_PHASE
+        if self.active == 0:
+            return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+        if method == "brute":
+            i, j = np.triu_indices(self.n, 1)
+        else:
+            i, j = gridPairs(self.pos[:self.n], self.size[:self.n])
+        if self.active < self.n:
+            awake = self.awake[i] | self.awake[j]
+            i, j = i[awake], j[awake]
+        return i, j
+
+    # separates and bounces every touching pair, out of pairs from candidatePairs() if not given
+    def resolveCollisions(self, pairs=None):
+        i, j = self.candidatePairs() if pairs is None else pairs
+        self.iterations, self.contacts = self.backend.resolve(self, i, j)
+        return self.iterations
+
+    # wall collision, then movement and friction, for every awake body at once
+    def step(self, field=None):
+        n = self.n
+        if self.active == 0:
+            return
+        rows = np.flatnonzero(self.awake[:n]) if self.active < n else slice(0, n) # a slice gives views, no copying
+        moving = self.backend.move(self, rows, field)
+
+        # anything that's stayed stopped long enough goes to sleep
+        self.moving[rows] = moving
+        self.movingCount = int(np.count_nonzero(moving)) # sleeping bodies are never moving
+        still = np.where(moving, 0, self.still[rows] + 1)
+        self.still[rows] = still
+        tired = still >= SLEEP_STEPS
+        if tired.any():
+            self.sleep(np.arange(n)[rows][tired])
+
+# what World.step and World.resolveCollisions hand the physics off to, in two versions that do the same math in the same
+# order, so they agree bit for bit (soccer_bench.py --parity checks):
+#   move(world, rows, field)  walls, movement (fast bodies swept) and friction for rows, returns which are still moving
+#   sweep(world, movers)      that movement for every body, following the given fast ones along their whole path
+#   resolve(world, i, j)      separates and bounces touching pairs, wakes sleepers that get hit, returns (passes, contacts)
+
+# numpy over whole arrays: a fixed cost per call, then cheap per body
+class ArraysBackend:
+    def move(self, world: World, rows, field):
+        subset = not isinstance(rows, slice)
+        pos, vel, size = world.pos[rows], world.vel[rows], world.size[rows]
+        reflectWalls(pos, vel, size)
+        fast = np.sqrt(vel[:, 0]**2 + vel[:, 1]**2) > CCD_SPEED*size if CCD else None
+        if CCD and fast.any():
+            if subset:
+                world.pos[rows], world.vel[rows] = pos, vel
+            self.sweep(world, np.arange(world.n)[rows][fast])
+            pos, vel = world.pos[rows], world.vel[rows]
+        else:
+            pos += vel
+
+        if field is None:
+            friction = np.full(len(pos), FRICTION)
+        else:
+            friction = field.friction(pos, size)
+        vel *= friction[:, None]
+        if subset:
+            world.pos[rows], world.vel[rows] = pos, vel
+        return np.sqrt(vel[:, 0]**2 + vel[:, 1]**2) > MOVING_SPEED
+
+    # walls bounce fast bodies where they're hit, and a body that would pass through another is stopped at the moment of
+    # impact, bounced off, and moves the rest of the way in a substep - so only bodies that actually hit something cost extra
+    def sweep(self, world: World, movers: np.ndarray):
+        n = world.n
+        pos, vel, mass, size = world.pos[:n], world.vel[:n], world.mass[:n], world.size[:n]
+        start = pos.copy()
+        pos += vel
+        pos[movers], flips = sweepWalls(start[movers], vel[movers], size[movers])
+        vel[movers] *= flips
+        remaining = np.ones(n) # fraction of the step each body has left to move
+
+        for substep in range(CCD_SUBSTEPS):
+            i, j, t = sweptPairs(start, pos, size, movers)
+            if not len(t):
+                return
+            # only each body's earliest impact, anything after it happens on the bounced path
+            first = np.full(n, np.inf)
+            np.minimum.at(first, i, t)
+            np.minimum.at(first, j, t)
+            earliest = (t == first[i]) & (t == first[j])
+            involved = np.unique(np.concatenate((i, j)))
+            i, j = i[earliest], j[earliest]
+            hit = np.unique(np.concatenate((i, j)))
+            # bodies whose impact was with one that hit something else first: their move is swept again, against the
+            # bounced paths, until nothing hits anything before the end of the step
+            later = np.setdiff1d(involved, hit, assume_unique=True)
+
+            if substep == CCD_SUBSTEPS-1: # out of substeps, everything still hitting stops where it touches for the solver
+                pos[involved] = start[involved] + (pos[involved] - start[involved]) * first[involved, None]
+                resolveContacts(pos, vel, mass, size, i, j, maxIterations=1)
+                world.wake(involved)
+                return
+
+            # back to where they touched, bounce, then the rest of the step from there
+            pos[hit] = start[hit] + (pos[hit] - start[hit]) * first[hit, None]
+            resolveContacts(pos, vel, mass, size, i, j, maxIterations=1)
+            world.wake(hit)
+            remaining[hit] *= 1 - first[hit]
+            begun = start[later]
+            start = pos.copy()
+            start[later] = begun # still moving the whole step, from where they began
+            pos[hit], flips = sweepWalls(start[hit], vel[hit] * remaining[hit, None], size[hit])
+            vel[hit] *= flips
+            movers = np.concatenate((hit, later))
+
+    def resolve(self, world: World, i: np.ndarray, j: np.ndarray):
+        n = world.n
+        pos, vel = world.pos[:n], world.vel[:n]
+        # sleeping bodies that something might run into, woken if it does
+        sleepers = np.unique(np.concatenate((i[~world.awake[i]], j[~world.awake[j]])))
+        before = pos[sleepers]
+        iterations, contacts = resolveContacts(pos, vel, world.mass[:n], world.size[:n], i, j)
+        if len(sleepers):
+            hit = (pos[sleepers] != before).any(1) | (vel[sleepers] != 0).any(1)
+            world.wake(sleepers[hit])
+        return iterations, contacts
+
+# plain floats, one body (or pair) at a time: no per-call overhead, so it wins while there are only a few bodies.
+# each call copies out just the rows it works on - the awake ones, the ones in a pair - and writes them back once
+class ScalarBackend:
+    def move(self, world: World, rows, field):
+        pos, vel, size = world.pos[rows].tolist(), world.vel[rows].tolist(), world.size[rows].tolist()
+        fast = []
+        for k, (p, v) in enumerate(zip(pos, vel)):
+            p[0], p[1], v[0], v[1] = scalarReflect(p[0], p[1], v[0], v[1], size[k])
+            if CCD and math.sqrt(v[0]*v[0] + v[1]*v[1]) > CCD_SPEED*size[k]:
+                fast.append(k)
+        if fast:
+            world.pos[rows], world.vel[rows] = pos, vel
+            self.sweep(world, np.arange(world.n)[rows][fast].tolist())
+            pos, vel = world.pos[rows].tolist(), world.vel[rows].tolist()
+        else:
+            for p, v in zip(pos, vel):
+                p[0] += v[0]
+                p[1] += v[1]
+
+        moving = []
+        for k, (p, v) in enumerate(zip(pos, vel)):
+            f = FRICTION if field is None else field.frictionAt(p[0], p[1], size[k])
+            v[0] *= f
+            v[1] *= f
+            moving.append(math.sqrt(v[0]*v[0] + v[1]*v[1]) > MOVING_SPEED)
+        world.pos[rows], world.vel[rows] = pos, vel
+        return moving
+
+    # ArraysBackend.sweep step for step, on lists of [x, y]
+    def sweep(self, world: World, movers: list):
+        n = world.n
+        pos, vel = world.pos[:n].tolist(), world.vel[:n].tolist()
+        mass, size = world.mass[:n].tolist(), world.size[:n].tolist()
+        start = [p[:] for p in pos]
+        for p, v in zip(pos, vel):
+            p[0] += v[0]
+            p[1] += v[1]
+        for k in movers:
+            pos[k][0], pos[k][1], flipX, flipY = scalarSweepWalls(start[k][0], start[k][1], vel[k][0], vel[k][1], size[k])
+            vel[k][0] *= flipX
+            vel[k][1] *= flipY
+        remaining = [1.0] * n
+        woken = set()
+
+        for substep in range(CCD_SUBSTEPS):
+            impacts = scalarSweptPairs(start, pos, size, movers)
+            if not impacts:
+                break
+            first = [math.inf] * n
+            for a, b, t in impacts:
+                first[a] = min(first[a], t)
+                first[b] = min(first[b], t)
+            involved = sorted({a for a, b, t in impacts} | {b for a, b, t in impacts})
+            earliest = [(a, b) for a, b, t in impacts if t == first[a] and t == first[b]]
+            i, j = [a for a, b in earliest], [b for a, b in earliest]
+            hit = sorted(set(i) | set(j))
+            later = [k for k in involved if k not in hit]
+
+            if substep == CCD_SUBSTEPS-1:
+                for k in involved:
+                    for axis in (0, 1):
+                        pos[k][axis] = start[k][axis] + (pos[k][axis] - start[k][axis]) * first[k]
+                scalarContacts(pos, vel, mass, size, i, j, maxIterations=1)
+                woken.update(involved)
+                break
+
+            for k in hit:
+                for axis in (0, 1):
+                    pos[k][axis] = start[k][axis] + (pos[k][axis] - start[k][axis]) * first[k]
+            scalarContacts(pos, vel, mass, size, i, j, maxIterations=1)
+            woken.update(hit)
+            for k in hit:
+                remaining[k] *= 1 - first[k]
+            begun = {k: start[k] for k in later} # still moving the whole step, from where they began
+            start = [begun[k] if k in begun else p[:] for k, p in enumerate(pos)]
+            for k in hit:
+                pos[k][0], pos[k][1], flipX, flipY = scalarSweepWalls(start[k][0], start[k][1], vel[k][0] * remaining[k],
+                                                                      vel[k][1] * remaining[k], size[k])
+                vel[k][0] *= flipX
+                vel[k][1] *= flipY
+            movers = hit + later
+
+        world.pos[:n], world.vel[:n] = pos, vel
+        if woken:
+            world.wake(sorted(woken))
+
+    def resolve(self, world: World, i: np.ndarray, j: np.ndarray):
+        if not len(i):
+            return 0, 0
+        i, j = i.tolist(), j.tolist()
+        rows = sorted(set(i) | set(j)) # only the bodies in some pair, numbered in that order for scalarContacts
+        local = {row: k for k, row in enumerate(rows)}
+        pos, vel = world.pos[rows].tolist(), world.vel[rows].tolist()
+        awake = world.awake[rows].tolist()
+        sleepers = [k for k in range(len(rows)) if not awake[k]]
+        before = [tuple(pos[k]) for k in sleepers]
+        result = scalarContacts(pos, vel, world.mass[rows].tolist(), world.size[rows].tolist(),
+                                [local[row] for row in i], [local[row] for row in j])
+        world.pos[rows], world.vel[rows] = pos, vel
+        hit = [rows[k] for k, old in zip(sleepers, before) if tuple(pos[k]) != old or vel[k] != [0, 0]]
+        if hit:
+            world.wake(hit)
+        return result
+
+PHYSICS_BACKENDS = {"arrays": ArraysBackend(), "scalar": ScalarBackend()}
+
+# a body in a World - state lives in the world's arrays, the object only knows its row
 class PhysicalObject:
-    def __init__(self, x: int, y: int, mass: int, size: int, color: tuple, type=""):
-        self.x = x
-        self.y = y
-        self.mass = mass
-        self.size = size # radius of circle
+    __slots__ = ("world", "index", "color", "type")
+    def __init__(self, world: World, x: int, y: int, mass: int, size: int, color: tuple, type=""):
         self.color = color
         self.type = type
+        self.attach(world, x, y, mass, size)
 
-        self.v = np.zeros(2, dtype=np.float64)
-        self.moving = np.linalg.norm(self.v) > 0.001
+    # takes a row in world
+    def attach(self, world: World, x: int, y: int, mass: int, size: int):
+        self.world = world
+        self.index = world.add(self, x, y, mass, size)
 
-    def draw(self, surf: pygame.Surface):
-        pygame.draw.circle(surf, self.color, (self.x, self.y), self.size)
+    @property
+    def x(self):
+        return self.world.pos[self.index, 0]
 
-    def updatePos(self, glues=[]):
-        self.x += self.v[0]
-        self.y += self.v[1]
+    @x.setter
+    def x(self, value):
+        self.world.pos[self.index, 0] = value
+        self.world.wake([self.index])
 
-        friction = FRICTION
-        for glue in glues:
-            if distance(glue.x, glue.y, self.x,self.y) <= GLUE_SIZE+PLAYER_SIZE: # player is in glue
-                friction = GLUE_FRICTION # so they are frictioned more
-                break
-        self.v *= friction
+    @property
+    def y(self):
+        return self.world.pos[self.index, 1]
+
+    @y.setter
+    def y(self, value):
+        self.world.pos[self.index, 1] = value
+        self.world.wake([self.index])
+
+    @property
+    def v(self):
+        return self.world.vel[self.index] # view, so v[0] = ... writes through
+
+    @v.setter
+    def v(self, value):
+        self.world.vel[self.index] = value
+        self.world.updateMoving([self.index])
+        self.world.wake([self.index])
+
+    @property
+    def mass(self):
+        return self.world.mass[self.index]
 
-        self.moving = np.linalg.norm(self.v) > 0.001
+    @property
+    def size(self):
+        return self.world.size[self.index]
+
+    @property
+    def moving(self):
+        return self.world.moving[self.index]
+
+    def draw(self, surf: pygame.Surface):
+        return blitCircle(surf, self.x, self.y, self.size, self.color)
 
     # does NOT check for collision, only handles it
     def handleCollision(self, other): # THANKS ALEX
-        # Calculate the vector between the objects
-        delta = np.array([self.x - other.x, self.y - other.y])
-        distance = np.linalg.norm(delta)
-        
-        # Calculate overlap
-        overlap = self.size + other.size - distance
-        
-        if overlap > 0:
-            # Normalize the delta vector
-            normal = delta / distance
-            
-            # Separate the objects
-            separation = overlap * normal * 0.5
-            self.x += separation[0]
-            self.y += separation[1]
-            other.x -= separation[0]
-            other.y -= separation[1]
-            
-            # Calculate relative velocity
-            relative_velocity = self.v - other.v
-            
-            # Calculate velocity along the normal
-            velocity_along_normal = np.dot(relative_velocity, normal)
-            
-            # Do not resolve if velocities are separating
-            if velocity_along_normal > 0:
-                return
-            
-            # Calculate impulse scalar
-            impulse_scalar = -(1 + RESTITUTION) * velocity_along_normal
-            impulse_scalar /= 1/self.mass + 1/other.mass
-            
-            # Apply impulse
-            impulse = impulse_scalar * normal
-            self.v += impulse / self.mass
-            other.v -= impulse / other.mass
-            
-            # Apply friction
-            tangent = np.array([-normal[1], normal[0]])
-            friction_impulse_scalar = np.dot(relative_velocity, tangent) * FRICTION_COEFFICIENT
-            friction_impulse_scalar /= 1/self.mass + 1/other.mass
-            
-            # Ensure friction doesn't reverse velocity
-            if friction_impulse_scalar < 0:
-                friction_impulse = friction_impulse_scalar * tangent
-            else:
-                friction_impulse = -friction_impulse_scalar * tangent
-            
-            self.v += friction_impulse / self.mass
-            other.v -= friction_impulse / other.mass
-            
-            # Limit velocities to MAX_VEL
-            self.v = np.clip(self.v, -MAX_VEL, MAX_VEL)
-            other.v = np.clip(other.v, -MAX_VEL, MAX_VEL)
-    
-    # detects and handles collision with the wall
-    def handleWallCollision(self):
-        # field walls
-        if (self.y-self.size < Y_GAP): # top
-            self.v[1] = -self.v[1]
-            self.y = Y_GAP + self.size
-        if (self.y+self.size > Y_GAP+FIELD_HEIGHT): # bottom
-            self.v[1] = -self.v[1]
-            self.y = Y_GAP + FIELD_HEIGHT - self.size
-        # take into account the goal for left/right
-        if (self.y-self.size < GOAL_TOP or self.y+self.size > GOAL_BOTTOM):
-            if (self.x-self.size < X_GAP): # left
-                self.v[0] = -self.v[0] # reflect velocity horizontally
-                self.x = X_GAP + self.size # move it out of the wall
-            if (self.x+self.size > X_GAP+FIELD_WIDTH): # right
-                self.v[0] = -self.v[0]
-                self.x = X_GAP + FIELD_WIDTH - self.size
-        
-        # goal walls
-        if (self.x-self.size < LEFT_GOAL_BACK): # left goal back
-            self.v[0] = -self.v[0]
-            self.x = LEFT_GOAL_BACK + self.size
-        if (self.x+self.size > RIGHT_GOAL_BACK): # right goal back
-            self.v[0] = -self.v[0]
-            self.x = RIGHT_GOAL_BACK - self.size
-        # take into account object has to be inside goal
-        if (self.x < X_GAP or self.x > X_GAP + FIELD_WIDTH):
-            if (self.y-self.size < GOAL_TOP): # goal top
-                self.v[1] = -self.v[1]
-                self.y = GOAL_TOP + self.size
-            if (self.y+self.size > GOAL_BOTTOM): # goal bottom
-                self.v[1] = -self.v[1]
-                self.y = GOAL_BOTTOM - self.size
+        i, j = np.array([self.index]), np.array([other.index])
+        resolveContacts(self.world.pos, self.world.vel, self.world.mass, self.world.size, i, j, maxIterations=1)
+        self.world.wake([self.index, other.index])
 
 class Player(PhysicalObject):
-    hovered = False
-    def __init__(self, x, y, color):
-        super().__init__(x, y, PLAYER_MASS, PLAYER_SIZE, color)
+    __slots__ = ("hovered",)
+    def __init__(self, world, x, y, color):
+        super().__init__(world, x, y, PLAYER_MASS, PLAYER_SIZE, color)
+        self.hovered = False
 
     def draw(self, surf):
-        super().draw(surf)
-        if self.hovered:
-            pygame.draw.circle(surf, WHITE, (self.x, self.y), self.size, width=SELECTED_THICKNESS)
+        return blitCircle(surf, self.x, self.y, self.size, self.color, WHITE if self.hovered else None)
 
+# made up front by a FragmentPool, and only given a row in a world when a grenade goes off
 class Fragment(PhysicalObject):
-    def __init__(self, x: int, y: int, mass: int, size: int, color: tuple):
-        super().__init__(x, y, mass, size, color, "frag")
-        self.spawnTime = pygame.time.get_ticks()
+    __slots__ = ("spawnTick",)
+    def __init__(self, color=BLACK):
+        self.world = None
+        self.index = -1
+        self.color = color
+        self.type = "frag"
+        self.spawnTick = 0
+
+# fixed set of Fragment records reused across grenades, so a burst doesn't allocate and expiring is O(1) per fragment
+class FragmentPool:
+    def __init__(self, capacity=FRAG_POOL_SIZE):
+        self.capacity = capacity
+        self.free = [Fragment() for _ in range(capacity)]
+        self.active = deque() # in spawn order, so the oldest are always in front
+        self.highWater = 0 # most fragments that were alive at once
+        self.dropped = 0 # fragments not spawned because the pool was empty
+
+    @property
+    def occupancy(self):
+        return len(self.active)
+
+    def spawn(self, world: World, x: int, y: int, mass: int, size: int, color: tuple, spawnTick: int):
+        if not self.free:
+            self.dropped += 1
+            return None
+        frag = self.free.pop()
+        frag.color = color
+        frag.spawnTick = spawnTick
+        frag.attach(world, x, y, mass, size)
+        self.active.append(frag)
+        self.highWater = max(self.highWater, len(self.active))
+        return frag
+
+    # takes fragments older than FRAG_LIFETIME out of the world
+    def expire(self, world: World, tick: int):
+        expired = []
+        while self.active and tick - self.active[0].spawnTick > FRAG_LIFETIME:
+            expired.append(self.active.popleft())
+        expired.sort(key=lambda frag: frag.index, reverse=True) # same order every time, so rows (and replays) come out the same
+        for frag in expired:
+            world.remove(frag)
+            self.free.append(frag)
+
+    # forget every fragment, eg. when the world they were in is thrown away
+    def clear(self):
+        for frag in self.active:
+            frag.world, frag.index = None, -1
+        self.free.extend(self.active)
+        self.active.clear()
         
+
 class FieldObject:
     def __init__ (self, x: int, y: int, size: int, color: tuple, lifetime=-1):
         self.x = x
@@ -220,13 +593,433 @@ class FieldObject:
         self.lifetime = lifetime
     
     def draw(self, surf: pygame.Surface):
-        pygame.draw.circle(surf, self.color, (self.x, self.y), self.size)
+        return blitCircle(surf, self.x, self.y, self.size, self.color)
+
+# the glues rasterized into a grid holding, for each cell, the distance to the closest glue center
+# only rebuilt when glues change; looking up friction for any number of bodies is then one array gather
+class FrictionField:
+    def __init__(self, glues=()):
+        cols, rows = int(np.ceil(SCREEN_WIDTH/GLUE_CELL)), int(np.ceil(SCREEN_HEIGHT/GLUE_CELL))
+        self.cellX = (np.arange(cols, dtype=np.float32) + 0.5) * GLUE_CELL # cell centers
+        self.cellY = (np.arange(rows, dtype=np.float32) + 0.5) * GLUE_CELL
+        self.build(glues)
+
+    def build(self, glues):
+        self.empty = len(glues) == 0
+        if self.empty:
+            return
+        self.distance = np.full((len(self.cellY), len(self.cellX)), np.inf, dtype=np.float32)
+        for glue in glues:
+            np.minimum(self.distance, np.hypot(self.cellX[None, :] - glue.x, self.cellY[:, None] - glue.y), out=self.distance)
+
+    # friction() for one body, with plain floats
+    def frictionAt(self, x: float, y: float, size: float):
+        if self.empty:
+            return FRICTION
+        col = min(max(int(x / GLUE_CELL), 0), len(self.cellX)-1)
+        row = min(max(int(y / GLUE_CELL), 0), len(self.cellY)-1)
+        return GLUE_FRICTION if self.distance[row, col] <= GLUE_SIZE + size else FRICTION
+
+    # friction for bodies at pos with radius size - glued if the body touches any glue
+    def friction(self, pos: np.ndarray, size: np.ndarray):
+        if self.empty:
+            return np.full(np.shape(size), FRICTION)
+        col = np.clip((pos[..., 0] / GLUE_CELL).astype(np.intp), 0, len(self.cellX)-1)
+        row = np.clip((pos[..., 1] / GLUE_CELL).astype(np.intp), 0, len(self.cellY)-1)
+        inGlue = self.distance[row, col] <= GLUE_SIZE + size # body is in glue
+        return np.where(inGlue, GLUE_FRICTION, FRICTION) # so they are frictioned more
+
+# the rules of a match (turns, powerups, glue lifetimes, goals, winning) without any drawing or input,
+# so it runs headless as fast as the CPU allows; the pygame front end only feeds it input and draws it
+class Match:
+    profiler = None # a FrameProfiler to time each part of step() with
+    log = None # a soccer_log.EventLog recording what happens, for balance stats
+
+    def __init__(self, grenadeMode=GRENADE_MODE, physics=PHYSICS_BACKEND):
+        self.grenadeMode = grenadeMode
+        self.physics = physics # backend the world is stepped on, see PHYSICS_BACKEND
+        self.blueScore = 0
+        self.redScore = 0
+        self.turn = BLUE
+        self.powerup = True # powerup still available this turn
+        self.glues = []
+        self.frictionField = FrictionField()
+        self.win = False
+        self.tick = 0 # steps simulated so far
+        self.frags = FragmentPool()
+        self.reset()
+        self.initialState = self.getState()
+        self.inputs = [] # (tick, "shot", player_index, vx, vy) or (tick, "powerup", kind, x, y) - enough to replay the match
+
+    # put the ball and players back on their spawns
+    def reset(self):
+        self.frags.clear()
+        self.world = World(physics=self.physics)
+        self.objects = self.world.bodies
+        self.ball = PhysicalObject(self.world, SCREEN_WIDTH/2, SCREEN_HEIGHT/2, BALL_MASS, BALL_SIZE, WHITE)
+        for spawn in SPAWNS:
+            Player(self.world, X_GAP + spawn[0], Y_GAP + spawn[1], BLUE)
+            Player(self.world, SCREEN_WIDTH - X_GAP - spawn[0], Y_GAP + spawn[1], RED)
+        self.players = self.objects[1:]
+        self.scored = False
+
+    # everything needed to rebuild this match, as plain picklable data
+    def getState(self):
+        n = self.world.n
+        bodies = []
+        for obj in self.objects:
+            if obj is self.ball:
+                bodies.append(("ball", obj.color, 0))
+            elif obj.type == "frag":
+                bodies.append(("frag", obj.color, obj.spawnTick))
+            else:
+                bodies.append(("player", obj.color, 0))
+        return {
+            "pos": self.world.pos[:n].copy(), "vel": self.world.vel[:n].copy(),
+            "mass": self.world.mass[:n].copy(), "size": self.world.size[:n].copy(),
+            "moving": self.world.moving[:n].copy(), "awake": self.world.awake[:n].copy(), "still": self.world.still[:n].copy(),
+            "bodies": bodies,
+            "glues": [(glue.x, glue.y, glue.lifetime) for glue in self.glues],
+            "blueScore": self.blueScore, "redScore": self.redScore, "turn": self.turn,
+            "powerup": self.powerup, "scored": self.scored, "win": self.win, "tick": self.tick,
+            "grenadeMode": self.grenadeMode, "physics": self.physics,
+        }
+
+    def setState(self, state: dict):
+        self.frags = FragmentPool()
+        self.physics = state.get("physics", PHYSICS_BACKEND) # replay files don't say, every backend plays them out the same
+        self.world = World(max(16, len(state["bodies"])), self.physics)
+        self.objects = self.world.bodies
+        self.players = []
+        for (kind, color, spawnTick), pos, mass, size in zip(state["bodies"], state["pos"], state["mass"], state["size"]):
+            if kind == "player":
+                self.players.append(Player(self.world, pos[0], pos[1], color))
+            elif kind == "frag":
+                self.frags.spawn(self.world, pos[0], pos[1], mass, size, color, spawnTick)
+            else:
+                self.ball = PhysicalObject(self.world, pos[0], pos[1], mass, size, color)
+        self.frags.active = deque(sorted(self.frags.active, key=lambda frag: frag.spawnTick)) # rows aren't in spawn order
+        world = self.world
+        n = world.n
+        world.vel[:n] = state["vel"]
+        world.moving[:n] = state["moving"]
+        world.movingCount = int(np.count_nonzero(world.moving[:n]))
+        if "awake" in state: # replay files start from a fresh match, where everything is awake
+            world.awake[:n] = state["awake"]
+            world.still[:n] = state["still"]
+            world.active = int(np.count_nonzero(world.awake[:n]))
+        self.glues = [FieldObject(x, y, GLUE_SIZE, YELLOW, lifetime) for x, y, lifetime in state["glues"]]
+        self.frictionField = FrictionField(self.glues)
+        for key in ("blueScore", "redScore", "turn", "powerup", "scored", "win", "tick"):
+            setattr(self, key, state[key])
+        self.grenadeMode = state.get("grenadeMode", "fragments") # states saved before there was a choice
+
+    @classmethod
+    def fromState(cls, state: dict):
+        match = cls.__new__(cls)
+        match.setState(state)
+        match.initialState = state
+        match.inputs = []
+        return match
+
+    def moving(self):
+        return self.world.anyMoving()
+
+    # launch one of the current team's players, returns whether the shot was allowed
+    def apply_shot(self, player_index: int, vx: float, vy: float):
+        player = self.players[player_index]
+        if self.win or self.scored or player.color != self.turn or self.moving():
+            return False
+        player.v = clampVelocity(vx, vy)
+        self.inputs.append((self.tick, "shot", player_index, float(vx), float(vy)))
+        if self.log:
+            self.log.event(self.tick, "shot", self.turn, player_index, *player.v)
+
+        # swap turns, new round
+        if self.turn == RED:
+            self.turn = BLUE
+        else:
+            self.turn = RED
+        if self.log:
+            self.log.event(self.tick, "turn", self.turn)
+        self.powerup = True
+        for glue in self.glues[:]:
+            glue.lifetime -= 1
+            if glue.lifetime == 0:
+                self.glues.remove(glue)
+                self.frictionField.build(self.glues)
+        return True
+
+    # use this turn's powerup at (x, y), returns whether it was used
+    def apply_powerup(self, kind: str, x: int, y: int):
+        if self.win or not self.powerup or not inField(x, y):
+            return False
+        if kind == GRENADE and self.grenadeMode == "impulse":
+            blast(self.world, x, y)
+        elif kind == GRENADE:
+            spawnGrenade(self.frags, self.world, x, y, self.tick)
+        elif kind == GLUE:
+            self.glues.append(FieldObject(x, y, GLUE_SIZE, YELLOW, lifetime = GLUE_LIFE))
+            self.frictionField.build(self.glues)
+        else:
+            return False
+        self.powerup = False
+        self.inputs.append((self.tick, "powerup", kind, float(x), float(y)))
+        if self.log:
+            self.log.event(self.tick, "powerup", self.turn, kind, x, y)
+        return True
+
+    # applies an entry from inputs
+    def applyInput(self, input: tuple):
+        tick, kind, a, b, c = input
+        if kind == "shot":
+            return self.apply_shot(a, b, c)
+        return self.apply_powerup(a, b, c)
+
+    # advances one frame, returns the color that scored (if a goal went in this step)
+    def step(self):
+        profiler = self.profiler
+        self.world.step(self.frictionField)
+        self.tick += 1
+        self.frags.expire(self.world, self.tick)
+        if profiler:
+            profiler.mark("physics")
+
+        pairs = self.world.candidatePairs()
+        if profiler:
+            profiler.mark("pairs")
+        self.world.resolveCollisions(pairs)
+        if profiler:
+            profiler.mark("collisions")
+            profiler.count("bodies", self.world.n)
+            profiler.count("pairs", len(pairs[0]))
+            profiler.count("contacts", self.world.contacts)
+            profiler.count("iterations", self.world.iterations)
+
+        # detect for scoring
+        scorer = None
+        if not self.scored:
+            if self.ball.x < X_GAP:
+                scorer = RED
+                self.redScore += 1
+                self.turn = BLUE
+            elif self.ball.x > X_GAP+FIELD_WIDTH:
+                scorer = BLUE
+                self.blueScore += 1
+                self.turn = RED
+            if scorer is not None:
+                self.scored = True
+                self.win = max(self.blueScore, self.redScore) >= WIN_SCORE
+                self.powerup = False
+                if self.log:
+                    self.log.event(self.tick, "goal", scorer, 0, self.ball.x, self.ball.y)
+                    self.log.event(self.tick, "win" if self.win else "turn", scorer if self.win else self.turn)
+        # after a goal let it run until everything stops moving, then reset
+        elif not self.win and not self.moving():
+            self.reset()
+        if self.log:
+            self.log.stepped(self)
+        return scorer
+
+    # steps until everything stops moving, returns the number of steps taken
+    def run_until_rest(self, maxSteps=100000):
+        steps = 0
+        while steps < maxSteps and (self.moving() or (self.scored and not self.win)):
+            self.step()
+            steps += 1
+        return steps
+
+# a shot played out on a copy of the match, recording the paths of the shooter and the ball until each has bounced
+# PREVIEW_BOUNCES times (or everything stops); advance() simulates in slices so it can be spread over frames
+class ShotRollout:
+    def __init__(self, state: dict, playerIndex: int, vx: float, vy: float, color: tuple):
+        self.match = Match.fromState(state)
+        self.match.apply_shot(playerIndex, vx, vy)
+        self.bodies = [self.match.players[playerIndex], self.match.ball]
+        self.colors = [color, WHITE]
+        self.points = [[(body.x, body.y)] for body in self.bodies]
+        self.lastVel = [tuple(body.v) for body in self.bodies] # copies, body.v is a view that the next step overwrites
+        self.bounces = [0, 0]
+        self.steps = 0
+        self.done = False
+
+    # steps until done or time.perf_counter() passes deadline
+    def advance(self, deadline: float):
+        match = self.match
+        while not self.done and time.perf_counter() < deadline:
+            match.step()
+            self.steps += 1
+            for k, body in enumerate(self.bodies):
+                if self.bounces[k] >= PREVIEW_BOUNCES:
+                    continue
+                (lastX, lastY), (vx, vy) = self.lastVel[k], body.v
+                speeds = np.hypot(lastX, lastY) * np.hypot(vx, vy)
+                if speeds > 0 and lastX*vx + lastY*vy < PREVIEW_TURN * speeds:
+                    self.bounces[k] += 1
+                self.lastVel[k] = vx, vy
+                if (body.x, body.y) != self.points[k][-1]:
+                    self.points[k].append((body.x, body.y))
+            self.done = self.steps >= PREVIEW_STEPS or not match.moving() or min(self.bounces) >= PREVIEW_BOUNCES
+
+    # (color, points) for each body that's gone anywhere
+    def paths(self):
+        return [(color, points) for color, points in zip(self.colors, self.points) if len(points) > 1]
+
+# predicted paths of the shot being aimed: each rollout is kept, by player and aim rounded to PREVIEW_QUANTUM, until the
+# board changes - so a still mouse, or going back to an aim already tried, doesn't simulate again. at most
+# PREVIEW_BUDGET ms are simulated per frame, a new aim shows up partly drawn rather than making the frame late
+class ShotPreview:
+    def __init__(self, maxSize=PREVIEW_CACHE_SIZE, budget=PREVIEW_BUDGET):
+        self.maxSize = maxSize
+        self.budget = budget
+        self.rollouts = OrderedDict() # least recently used first
+        self.board = None
+        self.busy = False # the last aim asked for isn't fully simulated yet
+        self.hits = 0
+        self.misses = 0
+
+    # everything in a Match.getState() a shot's outcome depends on that can change between turns
+    def boardKey(self, state: dict):
+        return state["pos"].tobytes(), state["vel"].tobytes(), tuple(state["glues"]), state["turn"], state["scored"]
+
+    # the rollout for shooting players[playerIndex] with (vx, vy) from state, simulated further if it isn't done
+    def rollout(self, state: dict, playerIndex: int, vx: float, vy: float):
+        board = self.boardKey(state)
+        if board != self.board:
+            self.board, self.state = board, state
+            self.rollouts.clear()
+        key = (playerIndex, round(vx / PREVIEW_QUANTUM), round(vy / PREVIEW_QUANTUM))
+        rollout = self.rollouts.get(key)
+        if rollout is None:
+            self.misses += 1
+            aim = clampVelocity(key[1] * PREVIEW_QUANTUM, key[2] * PREVIEW_QUANTUM)
+            rollout = self.rollouts[key] = ShotRollout(self.state, playerIndex, *aim, state["turn"])
+            if len(self.rollouts) > self.maxSize:
+                self.rollouts.popitem(last=False)
+        else:
+            self.hits += 1
+            self.rollouts.move_to_end(key)
+        rollout.advance(time.perf_counter() + self.budget/1000)
+        self.busy = not rollout.done
+        return rollout
+
+# runs a match on its own thread at TICK_RATE, however fast (or slow) frames are drawn
+# inputs are queued and applied at the start of the next step; after every step a new snapshot (a dict, never changed
+# once published) replaces the older of the two kept, and view() interpolates between them for drawing
+# with nothing moving and nothing left to play out it blocks on the input queue instead of stepping
+class MatchThread:
+    def __init__(self, match: Match, tickRate=TICK_RATE):
+        self.match = match
+        self.interval = 1 / tickRate
+        self.inputs = queue.Queue()
+        self.sent = 0 # inputs queued so far; snapshots count the ones applied, so callers can tell when they've landed
+        self.applied = 0
+        self.restState = None
+        self.scorer = None # whoever scored last
+        self.snapshots = (None, self.snapshot()) # previous, current - swapped in as one tuple, so readers get a matching pair
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.running = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        self.inputs.put(None) # in case it's waiting for input
+        self.thread.join()
+
+    # same as the Match methods, but only queued - the return value doesn't say whether the match allowed it
+    def apply_shot(self, player_index: int, vx: float, vy: float):
+        self.send("shot", player_index, vx, vy)
+        return True
+
+    def apply_powerup(self, kind: str, x: int, y: int):
+        self.send("powerup", kind, x, y)
+        return True
+
+    def send(self, kind: str, a, b: float, c: float):
+        self.sent += 1
+        self.inputs.put((kind, a, b, c))
+
+    def snapshot(self):
+        match, world = self.match, self.match.world
+        n = world.n
+        if self.restState is None and self.resting(): # what the AI and shot preview start from, once per rest
+            self.restState = match.getState()
+        return {
+            "time": time.perf_counter(), "tick": match.tick,
+            "pos": world.pos[:n].copy(), "size": world.size[:n].copy(),
+            "ids": [id(body) for body in world.bodies], "colors": [body.color for body in world.bodies],
+            "players": [player.index for player in match.players],
+            "glues": [(glue.x, glue.y) for glue in match.glues],
+            "blueScore": match.blueScore, "redScore": match.redScore, "turn": match.turn, "powerup": match.powerup,
+            "scored": match.scored, "win": match.win, "moving": match.moving(), "applied": self.applied,
+            "restState": self.restState, "scorer": self.scorer,
+        }
+
+    # nothing to simulate until someone does something
+    def resting(self):
+        match = self.match
+        return not match.moving() and not (match.scored and not match.win) and not match.frags.active
+
+    def run(self):
+        match = self.match
+        nextTick = time.perf_counter()
+        while self.running:
+            resting = self.resting()
+            try:
+                # waiting at rest means the steps in between are never simulated, which a replay doesn't mind
+                item = self.inputs.get(block=resting)
+                while item is not None:
+                    match.applyInput((match.tick,) + item)
+                    self.applied += 1
+                    self.restState = None
+                    item = self.inputs.get_nowait()
+            except queue.Empty:
+                pass
+            if not self.running:
+                break
+            if resting:
+                nextTick = time.perf_counter() # the time spent waiting doesn't need simulating
+
+            profiler = match.profiler
+            if profiler: profiler.skip()
+            scorer = match.step()
+            if profiler: profiler.endFrame()
+            if scorer is not None:
+                self.scorer = scorer
+            if match.moving():
+                self.restState = None
+            self.snapshots = (self.snapshots[1], self.snapshot())
+
+            nextTick += self.interval
+            delay = nextTick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -MAX_TICKS_PER_FRAME * self.interval: # too far behind to catch up, drop it
+                nextTick = time.perf_counter()
+
+    # the latest snapshot, with positions moved the fraction of a step that's passed since it was taken, back toward
+    # the previous one - so drawing lags the simulation by at most a step and bodies move smoothly at any frame rate
+    def view(self, now=None):
+        previous, current = self.snapshots
+        if previous is None or len(previous["ids"]) != len(current["ids"]):
+            return current
+        now = time.perf_counter() if now is None else now
+        behind = 1 - min(1, (now - current["time"]) / self.interval)
+        if behind == 0:
+            return current
+        same = np.equal(previous["ids"], current["ids"]) # rows that still hold the same body (fragments come and go)
+        view = dict(current)
+        view["pos"] = current["pos"] + (previous["pos"] - current["pos"]) * (behind * same)[:, None]
+        return view
 
 class MenuButton:
     def __init__(self, color: tuple, center: tuple, img: str):
         self.color = color
         self.center = center
-        self.img = pygame.image.load(img)
+        self.img = loadImage(img)
         self.rect = pygame.Rect(self.center[0]-ICON_SIZE/2, self.center[1]-ICON_SIZE/2, ICON_SIZE, ICON_SIZE)
 
         self.hovered = False
@@ -261,24 +1054,38 @@ class Button:
 class PowerupButton(Button):
     def __init__(self, rect: pygame.Rect, name: str, img: str):
         self.name = name
-        self.img = pygame.image.load(img)
+        self.img = loadImage(img)
         assert self.img.get_width() == ICON_SIZE and self.img.get_height() == ICON_SIZE, "Image is wrong size for powerup"
 
         super().__init__(BLUE, rect)
-   
-    def draw(self, surf: pygame.Surface, powerupAvailable=True):
+
+        # every way the button can look, each drawn the first time it's needed: (color, hovered, selected, powerupAvailable) -> surface
+        self.sprites = {}
+
+    def buildSprite(self, color: tuple, hovered: bool, selected: bool, powerupAvailable: bool):
+        current = self.color, self.hovered, self.selected
+        self.color, self.hovered, self.selected = color, hovered, selected
         buttonSurf = pygame.Surface((ICON_SIZE, ICON_SIZE), pygame.SRCALPHA)
         buttonSurf.fill((0,0,0,0))
+        super().draw(buttonSurf, drawRect=BUTTON_RECT) # draw button rectangle
+        buttonSurf.blit(self.img, BUTTON_RECT)
+        buttonSurf = buttonSurf.convert_alpha()
         if not powerupAvailable: # if powerup isn't available, "grey out" the icon
             buttonSurf.set_alpha(170)
 
-        super().draw(buttonSurf, drawRect=BUTTON_RECT) # draw button rectangle
-        buttonSurf.blit(self.img, BUTTON_RECT)
-        surf.blit(buttonSurf, (self.rect.left, self.rect.top))
+        self.sprites[(color, hovered, selected, powerupAvailable)] = buttonSurf
+        self.color, self.hovered, self.selected = current
+        return buttonSurf
+   
+    def draw(self, surf: pygame.Surface, powerupAvailable=True):
+        sprite = self.sprites.get((self.color, self.hovered, self.selected, powerupAvailable))
+        if sprite is None:
+            sprite = self.buildSprite(self.color, self.hovered, self.selected, powerupAvailable)
+        return surf.blit(sprite, (self.rect.left, self.rect.top))
 
 class TextButton(Button):
     def __init__(self, bgColor: tuple, text: str, font: pygame.font, textColor: tuple):
-        self.text = font.render(text, True, textColor)
+        self.text = textCache.render(font, text, textColor)
         self.rect = self.text.get_rect(center=(SCREEN_WIDTH/2, SCREEN_HEIGHT/2))
 
         super().__init__(bgColor, self.rect)
@@ -287,7 +1094,290 @@ class TextButton(Button):
         super().draw(surf, self.rect)
         surf.blit(self.text, self.rect)
 
+# least recently used cache of rendered text, since the same few strings get drawn every frame
+class TextCache:
+    def __init__(self, maxSize=TEXT_CACHE_SIZE):
+        self.maxSize = maxSize
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font: pygame.font, text: str, color: tuple, antialias=True):
+        key = (font, text, tuple(color), antialias)
+        surf = self.surfaces.get(key)
+        if surf is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surf
+        self.misses += 1
+        surf = font.render(text, antialias, color)
+        self.surfaces[key] = surf
+        if len(self.surfaces) > self.maxSize:
+            self.surfaces.popitem(last=False) # least recently used
+        return surf
+
+textCache = TextCache()
+
+# pygame.font.SysFont, but the name -> font file lookup is saved to disk: SysFont scans every installed font the first
+# time it's used (slow on Linux, where fc-list lists them all), and the fonts asked for here are usually missing anyway
+# the saved lookups are thrown away when the mtime of any font directory, or any directory under one, changes - fonts
+# usually go in a subdirectory (/usr/share/fonts/truetype/<family>/), which only touches its parent's mtime
+class FontCache:
+    def __init__(self, path=FONT_CACHE_FILE, fontDirs=FONT_DIRS):
+        self.path = path
+        self.fontDirs = [os.path.expanduser(fontDir) for fontDir in fontDirs]
+        self.paths = None # name -> font file (None = not installed, use pygame's default), read on first use
+        self.fonts = {} # (name, size) -> font
+
+    def dirTimes(self):
+        times = {}
+        for fontDir in self.fontDirs:
+            for directory, _, _ in os.walk(fontDir): # nothing for a directory that doesn't exist
+                try:
+                    times[directory] = os.stat(directory).st_mtime_ns
+                except OSError:
+                    pass
+        return times
+
+    def load(self):
+        self.times = self.dirTimes()
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            saved = {}
+        self.paths = saved.get("fonts", {}) if saved.get("dirs") == self.times else {}
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path + ".tmp", "w") as f:
+                json.dump({"dirs": self.times, "fonts": self.paths}, f)
+            os.replace(self.path + ".tmp", self.path) # so a crash mid-write never leaves half a file
+        except OSError: # read-only home, etc. - just scan again next time
+            pass
+
+    def resolve(self, name: str):
+        if self.paths is None:
+            self.load()
+        path = self.paths.get(name, "")
+        if path == "" or (path is not None and not os.path.exists(path)):
+            path = self.paths[name] = pygame.font.match_font(name)
+            self.save()
+        return path
+
+    def get(self, name: str, size: int):
+        key = (name, size)
+        if key not in self.fonts:
+            self.fonts[key] = pygame.font.Font(self.resolve(name), size)
+        return self.fonts[key]
+
+fontCache = FontCache()
+
+# keeps a pre-rendered background and only pushes the parts of the screen that changed to the display
+# every frame: begin() restores last frame's drawn areas from the background, draw everything again
+# (reporting each drawn rect with add()), then end() updates only the rects whose contents changed
+class DirtyRenderer:
+    def __init__(self, surf: pygame.Surface, drawBackground):
+        self.surf = surf
+        self.background = pygame.Surface(surf.get_size()).convert()
+        drawBackground(self.background)
+        self.drawn = set() # (rect, appearance) drawn last frame
+        self.invalidate()
+
+    # redraw and update the whole screen next frame, eg. after another screen was shown
+    def invalidate(self):
+        self.full = True
+
+    def begin(self):
+        self.current = set()
+        if self.full:
+            self.surf.blit(self.background, (0, 0))
+            return
+        for rect, _ in self.drawn:
+            self.surf.blit(self.background, rect, pygame.Rect(rect))
+
+    # appearance is anything that changes the pixels inside rect (color, text, hovered, ...)
+    def add(self, rect: pygame.Rect, *appearance):
+        self.current.add((tuple(rect), appearance))
+
+    def end(self):
+        if self.full:
+            pygame.display.update()
+            self.full = False
+        else:
+            # something that didn't move or change looks the same as last frame, unless something that did
+            # overlaps it - and then that thing's rect covers the overlap
+            changed = [pygame.Rect(rect) for rect, _ in self.drawn ^ self.current]
+            if changed:
+                pygame.display.update(changed)
+        self.drawn = self.current
+
+# times each part of a frame (opt in with --profile or the SOCCER_PROFILE environment variable)
+# call mark(phase) at the end of each phase and endFrame() once per frame; time between marks goes to the phase
+# a profiler timing work on another thread (the MatchThread's, one "frame" per step) can be given as sub: each CSV row
+# then also holds the sub's phase times and counters, summed over the steps it finished since the previous row
+class FrameProfiler:
+    def __init__(self, csvPath=None, window=PROFILE_WINDOW, phases=PROFILE_PHASES):
+        self.phases = phases
+        self.sub = None
+        self.lock = threading.Lock() # guards the unreported totals, which the thread collecting them doesn't own
+        self.unreported = (dict.fromkeys(phases, 0), dict.fromkeys(PROFILE_COUNTERS, 0), 0) # phases, counters, frames
+        self.times = {phase: deque(maxlen=window) for phase in phases + ("total",)} # nanoseconds per frame
+        self.frame = dict.fromkeys(phases, 0)
+        self.counters = dict.fromkeys(PROFILE_COUNTERS, 0)
+        self.lastCounters = self.counters # last finished frame's, for the overlay
+        self.frames = 0
+        self.overlay = []
+        self.font = None
+        self.csvFile = None
+        if csvPath:
+            self.csvFile = open(csvPath, "w", newline="")
+            self.csv = csv.writer(self.csvFile)
+            self.csv.writerow(("frame",) + tuple(phase + "_ns" for phase in PROFILE_PHASES) + PROFILE_COUNTERS + ("steps",))
+        self.last = time.perf_counter_ns()
+
+    def mark(self, phase: str):
+        now = time.perf_counter_ns()
+        self.frame[phase] += now - self.last
+        self.last = now
+
+    def count(self, counter: str, value: int):
+        self.counters[counter] += value
+
+    # skips whatever happened since the last mark (eg. waiting for the next frame)
+    def skip(self):
+        self.last = time.perf_counter_ns()
+
+    def endFrame(self):
+        total = 0
+        for phase, ns in self.frame.items():
+            self.times[phase].append(ns)
+            total += ns
+        self.times["total"].append(total)
+        with self.lock:
+            phases, counters, frames = self.unreported
+            for phase, ns in self.frame.items():
+                phases[phase] += ns
+            for counter, value in self.counters.items():
+                counters[counter] += value
+            self.unreported = phases, counters, frames + 1
+        if self.csvFile:
+            phases, counters, steps = self.collect()
+            if self.sub:
+                subPhases, subCounters, steps = self.sub.collect()
+                phases.update(subPhases)
+                for counter, value in subCounters.items():
+                    counters[counter] += value
+            self.csv.writerow((self.frames,) + tuple(phases.get(phase, 0) for phase in PROFILE_PHASES)
+                              + tuple(counters.values()) + (steps,))
+        self.frames += 1
+        self.frame = dict.fromkeys(self.phases, 0)
+        self.lastCounters = self.counters
+        self.counters = dict.fromkeys(PROFILE_COUNTERS, 0)
+
+    # (phase times, counters, frames) totalled over the frames finished since the last call
+    def collect(self):
+        with self.lock:
+            unreported = self.unreported
+            self.unreported = (dict.fromkeys(self.phases, 0), dict.fromkeys(PROFILE_COUNTERS, 0), 0)
+        return unreported
+
+    # p50, p95, p99 in milliseconds
+    def percentiles(self, phase: str):
+        if not self.times[phase]:
+            return 0, 0, 0
+        return tuple(np.percentile(self.times[phase], (50, 95, 99)) / 1e6)
+
+    def draw(self, surf: pygame.Surface, renderer, top=SCORE_SIZE):
+        if self.font is None:
+            self.font = fontCache.get(SCORE_FONT, PROFILE_SIZE)
+        if self.frames % PROFILE_REFRESH == 1 or not self.overlay:
+            self.overlay = ["%-10s %5s %5s %5s" % ("ms", "p50", "p95", "p99")]
+            for phase in self.phases + ("total",):
+                self.overlay.append("%-10s %5.2f %5.2f %5.2f" % ((phase,) + self.percentiles(phase)))
+            self.overlay.append("  ".join("%s %d" % item for item in self.lastCounters.items()))
+        for i, line in enumerate(self.overlay):
+            drawText(surf, renderer, self.font, line, WHITE, topright=(SCREEN_WIDTH, top + i*PROFILE_SIZE))
+
+    def flush(self):
+        if self.csvFile:
+            self.csvFile.flush()
+
 #  ---------------------- define functions
+# images, converted for the display the first time each is asked for (needs a display mode set)
+images = {}
+def loadImage(path: str):
+    if path not in images:
+        images[path] = pygame.image.load(path).convert_alpha()
+    return images[path]
+
+# transparent circle shown under the mouse while placing a powerup, drawn once per powerup
+previewSprites = {}
+def previewSprite(powerup: str):
+    if powerup not in previewSprites:
+        size, color = (GRENADE_SIZE, TRANSPARENT_BLACK) if powerup == GRENADE else (GLUE_SIZE, TRANSPARENT_YELLOW)
+        alphaSurf = pygame.Surface((size*2, size*2), pygame.SRCALPHA) # new surface to draw the transparency
+        pygame.draw.circle(alphaSurf, color, (size, size), size)
+        previewSprites[powerup] = alphaSurf.convert_alpha()
+    return previewSprites[powerup]
+
+# a filled circle (with an outline SELECTED_THICKNESS wide, if given) on a transparent square 2*radius+1 across, and
+# how far its center is from its corner - drawn once for each look: bodies and glue only come in a handful of sizes and
+# colors, so after the first frame drawing them is just blitting
+circleSprites = {}
+def circleSprite(radius: float, color: tuple, outline=None, antialias=None):
+    antialias = ANTIALIAS if antialias is None else antialias
+    key = (radius, color, outline, antialias)
+    if key not in circleSprites:
+        r = int(radius)
+        scale = ANTIALIAS_SCALE if antialias else 1
+        c = r*scale + scale//2 # center, and the radius out to the edge of the sprite
+        sprite = pygame.Surface(((r*2+1)*scale, (r*2+1)*scale), pygame.SRCALPHA if antialias else 0)
+        # antialiased, the corners are the edge's color but transparent, so scaling down doesn't darken the edge
+        sprite.fill(tuple(outline or color) + (0,) if antialias else SPRITE_KEY)
+        pygame.draw.circle(sprite, color, (c, c), c)
+        if outline:
+            pygame.draw.circle(sprite, outline, (c, c), c, width=SELECTED_THICKNESS*scale)
+        # run-length encoded, so blits skip the transparent corners (and only blend the edge pixels)
+        if antialias:
+            sprite = pygame.transform.smoothscale(sprite, (r*2+1, r*2+1))
+            if pygame.display.get_surface():
+                sprite = sprite.convert_alpha()
+            sprite.set_alpha(255, pygame.RLEACCEL)
+        else:
+            if pygame.display.get_surface():
+                sprite = sprite.convert()
+            sprite.set_colorkey(SPRITE_KEY, pygame.RLEACCEL)
+        circleSprites[key] = (sprite, r)
+    return circleSprites[key]
+
+def blitCircle(surf: pygame.Surface, x: float, y: float, radius: float, color: tuple, outline=None):
+    sprite, r = circleSprite(radius, color, outline)
+    return surf.blit(sprite, (x - r, y - r))
+
+# draws circles, each (layer, x, y, radius, color, outline or None), with one blits call: lower layers first, and in
+# the order given within a layer. every one goes to the renderer, with its color and outline as its look
+def drawCircles(surf: pygame.Surface, circles: list, renderer: DirtyRenderer):
+    circles.sort(key=itemgetter(0))
+    sprites = circleSprites
+    blits = []
+    for _, x, y, radius, color, outline in circles:
+        sprite, r = sprites.get((radius, color, outline, ANTIALIAS)) or circleSprite(radius, color, outline)
+        blits.append((sprite, (x - r, y - r)))
+    add = renderer.add
+    for rect, circle in zip(surf.blits(blits), circles):
+        add(rect, circle[4], circle[5])
+
+# idle mode: rather than drawing the same frame FPS times a second, sleep until there's input (or timeout ms pass,
+# None = no limit). the event that ended the wait is left in the queue for the loop to handle
+def waitForInput(timeout=None):
+    if not IDLE or pygame.event.peek():
+        return
+    event = pygame.event.wait() if timeout is None else pygame.event.wait(max(1, int(timeout)))
+    if event.type != pygame.NOEVENT:
+        pygame.event.post(event)
+
 def distance(x1: int, y1: int, x2: int, y2: int):
     return np.sqrt( (x1-x2)**2 + (y1-y2)**2 )
 
@@ -299,20 +1389,425 @@ def vectorToXY(magnitude: int, direction: float):
     y = np.sin(direction)*magnitude
     return x, y
 
+# works on single points or arrays of them
 def inField(x: int, y: int):
-    if (x > X_GAP and x < X_GAP+FIELD_WIDTH) and (y > Y_GAP and y < Y_GAP+FIELD_HEIGHT):
-        return True # main part of field
-    if (x > LEFT_GOAL_BACK and x < RIGHT_GOAL_BACK) and (y > GOAL_TOP and y < GOAL_BOTTOM):
-        return True # goals
-    return False
+    field = (x > X_GAP) & (x < X_GAP+FIELD_WIDTH) & (y > Y_GAP) & (y < Y_GAP+FIELD_HEIGHT) # main part of field
+    goals = (x > LEFT_GOAL_BACK) & (x < RIGHT_GOAL_BACK) & (y > GOAL_TOP) & (y < GOAL_BOTTOM) # goals
+    return field | goals
+
+# detects and handles collision with the wall for arrays of bodies
+# same checks, in the same order, as one object at a time - each check sees the previous one's fixes
+def reflectWalls(pos: np.ndarray, vel: np.ndarray, size: np.ndarray):
+    x, y = pos[..., 0], pos[..., 1]
+    vx, vy = vel[..., 0], vel[..., 1]
+
+    def bounce(v, p, hit, wall):
+        np.negative(v, out=v, where=hit) # reflect velocity
+        np.copyto(p, wall, where=hit) # move it out of the wall
+
+    # field walls
+    bounce(vy, y, y-size < Y_GAP, Y_GAP + size) # top
+    bounce(vy, y, y+size > Y_GAP+FIELD_HEIGHT, Y_GAP + FIELD_HEIGHT - size) # bottom
+    # take into account the goal for left/right
+    outsideGoal = (y-size < GOAL_TOP) | (y+size > GOAL_BOTTOM)
+    bounce(vx, x, outsideGoal & (x-size < X_GAP), X_GAP + size) # left
+    bounce(vx, x, outsideGoal & (x+size > X_GAP+FIELD_WIDTH), X_GAP + FIELD_WIDTH - size) # right
+
+    # goal walls
+    bounce(vx, x, x-size < LEFT_GOAL_BACK, LEFT_GOAL_BACK + size) # left goal back
+    bounce(vx, x, x+size > RIGHT_GOAL_BACK, RIGHT_GOAL_BACK - size) # right goal back
+    # take into account object has to be inside goal
+    insideGoal = (x < X_GAP) | (x > X_GAP + FIELD_WIDTH)
+    bounce(vy, y, insideGoal & (y-size < GOAL_TOP), GOAL_TOP + size) # goal top
+    bounce(vy, y, insideGoal & (y+size > GOAL_BOTTOM), GOAL_BOTTOM - size) # goal bottom
+
+# reflectWalls for one body, with plain floats - same checks in the same order, returns the new x, y, vx, vy
+def scalarReflect(x: float, y: float, vx: float, vy: float, size: float):
+    # field walls
+    if y-size < Y_GAP: # top
+        vy, y = -vy, Y_GAP + size
+    if y+size > Y_GAP+FIELD_HEIGHT: # bottom
+        vy, y = -vy, Y_GAP + FIELD_HEIGHT - size
+    # take into account the goal for left/right
+    outsideGoal = y-size < GOAL_TOP or y+size > GOAL_BOTTOM
+    if outsideGoal and x-size < X_GAP: # left
+        vx, x = -vx, X_GAP + size
+    if outsideGoal and x+size > X_GAP+FIELD_WIDTH: # right
+        vx, x = -vx, X_GAP + FIELD_WIDTH - size
+
+    # goal walls
+    if x-size < LEFT_GOAL_BACK: # left goal back
+        vx, x = -vx, LEFT_GOAL_BACK + size
+    if x+size > RIGHT_GOAL_BACK: # right goal back
+        vx, x = -vx, RIGHT_GOAL_BACK - size
+    # take into account object has to be inside goal
+    insideGoal = x < X_GAP or x > X_GAP + FIELD_WIDTH
+    if insideGoal and y-size < GOAL_TOP: # goal top
+        vy, y = -vy, GOAL_TOP + size
+    if insideGoal and y+size > GOAL_BOTTOM: # goal bottom
+        vy, y = -vy, GOAL_BOTTOM - size
+    return x, y, vx, vy
+
+# moves circles from start by the given displacement, bouncing off the walls where they're hit instead of after passing them
+# returns the end positions, and 1/-1 per velocity component for the ones that were reflected
+# the space a circle's center can be in is the field and the strip through both goals, each shrunk by the radius
+def sweepWalls(start: np.ndarray, displacement: np.ndarray, size: np.ndarray):
+    start, displacement = start.copy(), displacement.copy()
+    end = start + displacement
+    flips = np.ones_like(start)
+    boxes = (
+        (np.stack((X_GAP + size, Y_GAP + size), 1), np.stack((X_GAP + FIELD_WIDTH - size, Y_GAP + FIELD_HEIGHT - size), 1)), # field
+        (np.stack((LEFT_GOAL_BACK + size, GOAL_TOP + size), 1), np.stack((RIGHT_GOAL_BACK - size, GOAL_BOTTOM - size), 1)), # goals
+    )
+    # a straight move that starts and ends in the same box stays in it
+    contained = [((start >= low) & (start <= high) & (end >= low) & (end <= high)).all(1) for low, high in boxes]
+    rows = np.flatnonzero(~(contained[0] | contained[1]))
+    for bounce in range(CCD_BOUNCES):
+        if not len(rows):
+            break
+        p, d = start[rows], displacement[rows]
+        inside, exits, axes = [], [], []
+        for low, high in boxes:
+            # fraction of the move spent inside the box, per axis and then overall
+            with np.errstate(divide="ignore", invalid="ignore"):
+                t1, t2 = (low[rows] - p) / d, (high[rows] - p) / d
+            still = d == 0
+            inRange = (p >= low[rows] - 1e-9) & (p <= high[rows] + 1e-9)
+            t1 = np.where(still, np.where(inRange, -np.inf, np.inf), t1)
+            t2 = np.where(still, np.where(inRange, np.inf, -np.inf), t2)
+            enter, leave = np.minimum(t1, t2), np.maximum(t1, t2)
+            enters, exit = enter.max(1), leave.min(1)
+            inside.append((enters, exit))
+            exits.append(exit)
+            axes.append(leave.argmin(1))
+
+        # follow the path from box to box (eg. field, through the goal mouth, into the goal) until it leaves both
+        leaves = np.full(len(rows), -np.inf)
+        axis = np.zeros(len(rows), dtype=np.intp)
+        for _ in range(2):
+            for (enters, exit), boxAxis in zip(inside, axes):
+                joined = (enters <= np.maximum(leaves, 0) + 1e-9) & (exit >= -1e-9) & (enters <= exit) & (exit > leaves)
+                leaves = np.where(joined, exit, leaves)
+                axis = np.where(joined, boxAxis, axis)
+
+        # started outside both (eg. exactly on a corner) or never leaves: the straight move stands
+        hit = (leaves > -np.inf) & (leaves < 1)
+        if not hit.any():
+            break
+        rows, leaves, axis = rows[hit], leaves[hit], axis[hit]
+        impact = start[rows] + displacement[rows] * leaves[:, None]
+        rest = displacement[rows] * (1 - leaves[:, None])
+        rest[np.arange(len(rows)), axis] *= -1
+        flips[rows, axis] *= -1
+        start[rows], displacement[rows] = impact, rest
+        end[rows] = impact + rest
+    else:
+        end[rows] = start[rows] # out of bounces, stop at the last wall
+    return end, flips
+
+# sweepWalls for one body with plain floats, the same steps in the same order: returns where it ends up, and the sign each
+# velocity component ends up multiplied by
+def scalarSweepWalls(x: float, y: float, dx: float, dy: float, size: float):
+    endX, endY = x + dx, y + dy
+    flipX, flipY = 1.0, 1.0
+    boxes = (
+        (X_GAP + size, Y_GAP + size, X_GAP + FIELD_WIDTH - size, Y_GAP + FIELD_HEIGHT - size), # field
+        (LEFT_GOAL_BACK + size, GOAL_TOP + size, RIGHT_GOAL_BACK - size, GOAL_BOTTOM - size), # goals
+    )
+    for lowX, lowY, highX, highY in boxes:
+        if lowX <= x <= highX and lowY <= y <= highY and lowX <= endX <= highX and lowY <= endY <= highY:
+            return endX, endY, flipX, flipY
+    for bounce in range(CCD_BOUNCES):
+        inside = []
+        for lowX, lowY, highX, highY in boxes:
+            leaves = []
+            enters = -math.inf
+            for p, d, low, high in ((x, dx, lowX, highX), (y, dy, lowY, highY)):
+                if d == 0:
+                    inRange = low - 1e-9 <= p <= high + 1e-9
+                    t1, t2 = (-math.inf, math.inf) if inRange else (math.inf, -math.inf)
+                else:
+                    t1, t2 = (low - p) / d, (high - p) / d
+                enters = max(enters, min(t1, t2))
+                leaves.append(max(t1, t2))
+            inside.append((enters, min(leaves), 0 if leaves[0] <= leaves[1] else 1))
+
+        leaves, axis = -math.inf, 0
+        for _ in range(2):
+            for enters, exit, boxAxis in inside:
+                if enters <= max(leaves, 0) + 1e-9 and exit >= -1e-9 and enters <= exit and exit > leaves:
+                    leaves, axis = exit, boxAxis
+        if not -math.inf < leaves < 1:
+            return endX, endY, flipX, flipY
+        x, y, dx, dy = x + dx*leaves, y + dy*leaves, dx * (1 - leaves), dy * (1 - leaves)
+        if axis == 0:
+            dx, flipX = -dx, -flipX
+        else:
+            dy, flipY = -dy, -flipY
+        endX, endY = x + dx, y + dy
+    return x, y, flipX, flipY # out of bounces, stop at the last wall
+
+# pairs (i, j, t) where a mover from start to end would touch another body partway through the move (fraction t of it),
+# having not been touching at the start - bodies that only touch at the end are left to the solver
+def sweptPairs(start: np.ndarray, end: np.ndarray, size: np.ndarray, movers: np.ndarray):
+    displacement = end - start
+    # broad phase on circles around each whole move
+    i, j = gridPairs((start + end) / 2, size + np.hypot(displacement[:, 0], displacement[:, 1]) / 2)
+    isMover = np.zeros(len(start), dtype=bool)
+    isMover[movers] = True
+    either = isMover[i] | isMover[j]
+    i, j = i[either], j[either]
+
+    # relative to each other: |gap + relativeMove*t| = radii, solved for the first t
+    gap = start[i] - start[j]
+    relativeMove = displacement[i] - displacement[j]
+    a = np.einsum("ij,ij->i", relativeMove, relativeMove)
+    b = 2 * np.einsum("ij,ij->i", gap, relativeMove)
+    c = np.einsum("ij,ij->i", gap, gap) - (size[i] + size[j])**2
+    discriminant = b*b - 4*a*c
+    hits = (c > 0) & (b < 0) & (discriminant >= 0)
+    i, j, a, b, discriminant = i[hits], j[hits], a[hits], b[hits], discriminant[hits]
+    t = (-b - np.sqrt(discriminant)) / (2*a)
+    hits = t < 1
+    t = np.minimum(t[hits] + CCD_SKIN / np.sqrt(a[hits]), 1)
+    return i[hits], j[hits], t
 
-def spawnGrenade(objects: list, x: int, y: int):
+# sweptPairs on lists of [x, y] and plain floats, as (i, j, t) tuples in the same order - every pair is checked, which finds
+# the same impacts the grid does
+def scalarSweptPairs(start: list, end: list, size: list, movers: list):
+    n = len(start)
+    isMover = [False] * n
+    for k in movers:
+        isMover[k] = True
+    moves = [(e[0] - s[0], e[1] - s[1]) for s, e in zip(start, end)]
+    impacts = []
+    for i in range(n):
+        (ix, iy), (idx, idy) = start[i], moves[i]
+        for j in range(i+1, n):
+            if not (isMover[i] or isMover[j]):
+                continue
+            gx, gy = ix - start[j][0], iy - start[j][1]
+            rx, ry = idx - moves[j][0], idy - moves[j][1]
+            radii = size[i] + size[j]
+            a = rx*rx + ry*ry
+            b = 2 * (gx*rx + gy*ry)
+            c = gx*gx + gy*gy - radii*radii
+            if c > 0 and b < 0:
+                discriminant = b*b - 4*a*c
+                if discriminant >= 0:
+                    t = (-b - math.sqrt(discriminant)) / (2*a)
+                    if t < 1:
+                        impacts.append((i, j, min(t + CCD_SKIN / math.sqrt(a), 1.0)))
+    return impacts
+
+# resolves collisions for all candidate pairs (rows i[k], j[k]) at once, repeating until nothing overlaps
+# by more than tolerance or maxIterations passes are used; returns the number of passes and of contacts resolved
+def resolveContacts(pos: np.ndarray, vel: np.ndarray, mass: np.ndarray, size: np.ndarray, i: np.ndarray, j: np.ndarray,
+                    tolerance=SOLVER_TOLERANCE, maxIterations=SOLVER_ITERATIONS):
+    n = len(pos)
+    contacts = 0
+    for iteration in range(maxIterations):
+        # Calculate the vector between the objects, and overlap
+        delta = pos[i] - pos[j]
+        dist = np.sqrt(delta[:, 0]**2 + delta[:, 1]**2) # not np.hypot, which can round differently from the scalar backend
+        overlap = size[i] + size[j] - dist
+        touching = overlap > 0
+        if not touching.any() or (iteration > 0 and overlap.max() < tolerance):
+            return iteration, contacts
+        a, b = i[touching], j[touching]
+        contacts += len(a)
+        delta, dist, overlap = delta[touching], dist[touching], overlap[touching]
+
+        # Normalize the delta vector (bodies exactly on top of each other get pushed apart sideways)
+        stacked = dist == 0
+        normal = delta / np.where(stacked, 1, dist)[:, None]
+        normal[stacked] = 1, 0
+
+        # Separate the objects
+        separation = overlap[:, None] * normal * 0.5
+        pos += scatter(a, separation, n) - scatter(b, separation, n)
+
+        # Calculate relative velocity, and velocity along the normal
+        relativeVelocity = vel[a] - vel[b]
+        velocityAlongNormal = np.einsum("ij,ij->i", relativeVelocity, normal)
+
+        # Do not resolve if velocities are separating
+        approaching = velocityAlongNormal <= 0
+        if not approaching.any():
+            continue
+        a, b = a[approaching], b[approaching]
+        normal, relativeVelocity, velocityAlongNormal = normal[approaching], relativeVelocity[approaching], velocityAlongNormal[approaching]
+        inverseMass = 1/mass[a] + 1/mass[b]
+
+        # Impulse along the normal
+        impulse = (-(1 + RESTITUTION) * velocityAlongNormal / inverseMass)[:, None] * normal
+
+        # Friction along the tangent, always against it so it doesn't reverse velocity
+        tangent = np.stack((-normal[:, 1], normal[:, 0]), axis=1)
+        frictionScalar = np.einsum("ij,ij->i", relativeVelocity, tangent) * FRICTION_COEFFICIENT / inverseMass
+        impulse -= np.abs(frictionScalar)[:, None] * tangent
+
+        vel += scatter(a, impulse / mass[a, None], n) - scatter(b, impulse / mass[b, None], n)
+
+        # Limit velocities to MAX_VEL
+        hit = np.unique(np.concatenate((a, b)))
+        vel[hit] = np.clip(vel[hit], -MAX_VEL, MAX_VEL)
+    return maxIterations, contacts
+
+# resolveContacts on lists of [x, y] (changed in place) and plain floats, doing the same math in the same order:
+# every pass computes all the pairs from where things were at its start, then applies the sums
+def scalarContacts(pos: list, vel: list, mass: list, size: list, i: list, j: list,
+                   tolerance=SOLVER_TOLERANCE, maxIterations=SOLVER_ITERATIONS):
+    n = len(pos)
+    contacts = 0
+    for iteration in range(maxIterations):
+        touching = []
+        for a, b in zip(i, j):
+            dx, dy = pos[a][0] - pos[b][0], pos[a][1] - pos[b][1]
+            dist = math.sqrt(dx*dx + dy*dy)
+            overlap = size[a] + size[b] - dist
+            if overlap > 0:
+                touching.append((a, b, dx, dy, dist, overlap))
+        if not touching or (iteration > 0 and max(contact[5] for contact in touching) < tolerance):
+            return iteration, contacts
+        contacts += len(touching)
+
+        # separate, and work out each approaching pair's impulse from the velocities before any of them
+        plus, minus = [[0.0, 0.0] for _ in range(n)], [[0.0, 0.0] for _ in range(n)]
+        impulses = []
+        for a, b, dx, dy, dist, overlap in touching:
+            nx, ny = (1.0, 0.0) if dist == 0 else (dx / dist, dy / dist)
+            sx, sy = overlap * nx * 0.5, overlap * ny * 0.5
+            plus[a][0] += sx
+            plus[a][1] += sy
+            minus[b][0] += sx
+            minus[b][1] += sy
+
+            rvx, rvy = vel[a][0] - vel[b][0], vel[a][1] - vel[b][1]
+            velocityAlongNormal = rvx*nx + rvy*ny
+            if velocityAlongNormal > 0: # separating
+                continue
+            inverseMass = 1/mass[a] + 1/mass[b]
+            k = -(1 + RESTITUTION) * velocityAlongNormal / inverseMass
+            friction = abs((rvx*-ny + rvy*nx) * FRICTION_COEFFICIENT / inverseMass)
+            impulses.append((a, b, k*nx - friction*-ny, k*ny - friction*nx))
+        for k in range(n):
+            pos[k][0] += plus[k][0] - minus[k][0]
+            pos[k][1] += plus[k][1] - minus[k][1]
+        if not impulses:
+            continue
+
+        plus, minus = [[0.0, 0.0] for _ in range(n)], [[0.0, 0.0] for _ in range(n)]
+        for a, b, ix, iy in impulses:
+            plus[a][0] += ix / mass[a]
+            plus[a][1] += iy / mass[a]
+            minus[b][0] += ix / mass[b]
+            minus[b][1] += iy / mass[b]
+        hit = set()
+        for a, b, ix, iy in impulses:
+            hit.add(a)
+            hit.add(b)
+        for k in range(n):
+            vel[k][0] += plus[k][0] - minus[k][0]
+            vel[k][1] += plus[k][1] - minus[k][1]
+        # Limit velocities to MAX_VEL
+        for k in hit:
+            vel[k][0] = min(max(vel[k][0], -MAX_VEL), MAX_VEL)
+            vel[k][1] = min(max(vel[k][1], -MAX_VEL), MAX_VEL)
+    return maxIterations, contacts
+
+# sums rows of values into an (n, 2) array at the given row indices
+def scatter(rows: np.ndarray, values: np.ndarray, n: int):
+    return np.stack((np.bincount(rows, values[:, 0], n), np.bincount(rows, values[:, 1], n)), axis=1)
+
+# spatial hash broad phase: bucket bodies by grid cell, only pair up bodies in the same or neighboring cells
+def gridPairs(pos: np.ndarray, size: np.ndarray, cell=GRID_CELL):
+    n = len(pos)
+    if n < 2:
+        return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+    cell = max(cell, 2*size.max()) # never smaller than the biggest contact distance
+
+    cells = np.floor(pos / cell).astype(np.int64)
+    cols = cells[:, 0] - cells[:, 0].min()
+    rows = cells[:, 1] - cells[:, 1].min() + 1 # leave room for row-1 without wrapping to the previous column
+    rowStride = rows.max() + 2
+    keys = cols*rowStride + rows
+    order = np.argsort(keys, kind="stable")
+    sortedKeys = keys[order]
+
+    first, second = [], []
+    # half of the neighborhood, so each pair of cells is only visited once
+    for dCol, dRow in ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1)):
+        neighborKeys = sortedKeys + dCol*rowStride + dRow
+        if dCol == 0 and dRow == 0: # same cell: only the bodies after this one
+            starts = np.arange(1, n+1)
+        else:
+            starts = np.searchsorted(sortedKeys, neighborKeys, "left")
+        ends = np.searchsorted(sortedKeys, neighborKeys, "right")
+        counts = np.maximum(ends - starts, 0)
+        total = counts.sum()
+        if total == 0:
+            continue
+        a = np.repeat(np.arange(n), counts)
+        b = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(starts, counts)
+        first.append(order[a])
+        second.append(order[b])
+
+    if not first:
+        return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+    first, second = np.concatenate(first), np.concatenate(second)
+    i, j = np.minimum(first, second), np.maximum(first, second)
+    sort = np.lexsort((j, i))
+    return i[sort], j[sort]
+
+# drag distance to shot velocity, applying a slight tweak
+def dragVelocity(startingX: int, startingY: int, mouseX: int, mouseY: int):
+    return clampVelocity(-(mouseX-startingX)/AIM_TWEAK, -(mouseY-startingY)/AIM_TWEAK)
+
+# limit velocity to MAX_VEL
+def clampVelocity(vx: float, vy: float):
+    speed = np.hypot(vx, vy)
+    if speed > MAX_VEL:
+        vx, vy = vx*MAX_VEL/speed, vy*MAX_VEL/speed
+    return float(vx), float(vy)
+
+def spawnGrenade(pool: FragmentPool, world: World, x: int, y: int, spawnTick=0):
+    frags = []
     for i in range(0, FRAG_COUNT):
-        frag = Fragment(x, y, FRAG_MASS, FRAG_SIZE, BLACK)
-        vel = np.array(vectorToXY(FRAG_VEL, np.pi*i/(FRAG_COUNT/2)))
-        frag.v = vel
-        
-        objects.append(frag)
+        frag = pool.spawn(world, x, y, FRAG_MASS, FRAG_SIZE, BLACK, spawnTick)
+        if frag is None: # pool is used up
+            break
+        frag.v = vectorToXY(FRAG_VEL, np.pi*i/(FRAG_COUNT/2))
+        frags.append(frag)
+    return frags
+
+# the grenade without fragments: every body within BLAST_RADIUS of (x, y) (measured to its edge) is pushed straight
+# away from it, less the further out it is, all in one pass instead of fragments colliding with things for several steps
+def blast(world: World, x: float, y: float, lineOfSight=BLAST_LINE_OF_SIGHT):
+    n = world.n
+    pos, vel, mass, size = world.pos[:n], world.vel[:n], world.mass[:n], world.size[:n]
+    offset = pos - (x, y)
+    dist = np.hypot(offset[:, 0], offset[:, 1])
+    reach = np.maximum(dist - size, 0)
+    hit = np.flatnonzero((reach < BLAST_RADIUS) & (dist > 0)) # a body dead on the center has no direction to go
+    if lineOfSight and len(hit):
+        # shielded: the line from the center to the body passes through some other body before getting there
+        toHit = offset[hit]
+        along = np.clip((offset @ toHit.T).T / (dist[hit, None]**2), 0, 1) # (hit, bodies): where each body is along each line
+        closest = along[..., None] * toHit[:, None] - offset[None]
+        blocked = (np.hypot(closest[..., 0], closest[..., 1]) < size) & (along > 0) & (along < 1)
+        blocked[np.arange(len(hit)), hit] = False
+        hit = hit[~blocked.any(1)]
+    if not len(hit):
+        return hit
+
+    strength = BLAST_IMPULSE * (1 - reach[hit] / BLAST_RADIUS) / mass[hit]
+    vel[hit] += offset[hit] / dist[hit, None] * strength[:, None]
+    speed = np.hypot(vel[hit, 0], vel[hit, 1])
+    vel[hit] *= np.minimum(1, MAX_VEL / speed)[:, None] # clampVelocity
+    world.wake(hit)
+    world.updateMoving(hit)
+    return hit
 
 def infoDisplay(DISPLAYSURF: pygame.Surface, font: pygame.font, clock: pygame.time.Clock, info: Button):
     # display info until user exits back to menu
@@ -337,106 +1832,105 @@ def infoDisplay(DISPLAYSURF: pygame.Surface, font: pygame.font, clock: pygame.ti
 
         DISPLAYSURF.fill(GREEN)
         for i in range(len(infoLines)): # display each line of text in its own line
-            text = font.render(infoLines[i], True, WHITE)
+            text = textCache.render(font, infoLines[i], WHITE)
             textRect = text.get_rect(midtop = (SCREEN_WIDTH/2, INFO_SIZE/2+INFO_SIZE*i))
             DISPLAYSURF.blit(text, textRect)
         info.draw(DISPLAYSURF)
 
         pygame.display.update()
         clock.tick(FPS)
+        waitForInput() # nothing changes until the mouse does
 
-def gameLoop(DISPLAYSURF: pygame.Surface):
-    pass
-
-def main():
-    # initialize pygame
-    pygame.init()
-    DISPLAYSURF = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-    DISPLAYSURF.fill(GREEN)
-    pygame.display.set_caption("Soccer")
-    clock = pygame.time.Clock()
-    pygame.font.init()
-    displayFont = pygame.font.SysFont("krungthep", DISPLAY_SIZE)
-    infoFont = pygame.font.SysFont("kefa", INFO_SIZE)
-    scoreFont = pygame.font.SysFont("menlo", SCORE_SIZE)
-    titleFont = pygame.font.SysFont("bradleyhand", TITLE_SIZE)
+def drawField(surf: pygame.Surface):
+    surf.fill(GREEN)
+    pygame.draw.rect(surf, WHITE, pygame.Rect(X_GAP, Y_GAP, FIELD_WIDTH, FIELD_HEIGHT), 1) # field lines
+    pygame.draw.rect(surf, BLUE, pygame.Rect(LEFT_GOAL_BACK, GOAL_TOP, GOAL_DEPTH, GOAL_HEIGHT), 1) # left goal
+    pygame.draw.rect(surf, RED, pygame.Rect(X_GAP+FIELD_WIDTH, GOAL_TOP, GOAL_DEPTH, GOAL_HEIGHT), 1) # right goal
+    pygame.draw.line(surf, GOLD, (X_GAP, GOAL_TOP), (X_GAP, GOAL_BOTTOM), 4) # left goal line
+    pygame.draw.line(surf, GOLD, (X_GAP+FIELD_WIDTH, GOAL_TOP), (X_GAP+FIELD_WIDTH, GOAL_BOTTOM), 4) # right goal line
 
-    titleText = titleFont.render("Soccer", True, WHITE)
-    titleRect = titleText.get_rect(midtop=(SCREEN_WIDTH/2,0))
-    playButton = TextButton(GOLD, "Play", displayFont, WHITE)
+# draws the glues and bodies over the field
+def drawMatch(surf: pygame.Surface, match: Match, renderer: DirtyRenderer):
+    circles = [(GLUE_LAYER, glue.x, glue.y, glue.size, glue.color, None) for glue in match.glues]
+    world = match.world
+    for (x, y), size, obj in zip(world.pos[:world.n].tolist(), world.size[:world.n].tolist(), match.objects):
+        hovered = getattr(obj, "hovered", False)
+        circles.append((SELECTED_LAYER if hovered else BODY_LAYER, x, y, size, obj.color, WHITE if hovered else None))
+    drawCircles(surf, circles, renderer)
 
-    infoButton = MenuButton(GOLD, (SCREEN_WIDTH-ICON_SIZE, SCREEN_HEIGHT-ICON_SIZE), "buttons/info.png")
+def drawPreview(surf: pygame.Surface, rollout: ShotRollout, renderer: DirtyRenderer):
+    for color, points in rollout.paths():
+        renderer.add(pygame.draw.lines(surf, color, False, points, PREVIEW_WIDTH), "preview", color, points[1], points[-1], len(points))
 
-    # initialize game
-    objects = []
+# same as drawMatch, from a MatchThread snapshot; the player in row selected gets the outline
+def drawSnapshot(surf: pygame.Surface, view: dict, renderer: DirtyRenderer, selected=None):
+    circles = [(GLUE_LAYER, x, y, GLUE_SIZE, YELLOW, None) for x, y in view["glues"]]
+    for row, ((x, y), size, color) in enumerate(zip(view["pos"].tolist(), view["size"].tolist(), view["colors"])):
+        if row == selected:
+            circles.append((SELECTED_LAYER, x, y, size, color, WHITE))
+        else:
+            circles.append((BODY_LAYER, x, y, size, color, None))
+    drawCircles(surf, circles, renderer)
 
-    selected = None
-    startingX, startingY = 0,0
+def drawText(surf: pygame.Surface, renderer: DirtyRenderer, font: pygame.font, text: str, color: tuple, **position):
+    rendered = textCache.render(font, text, color)
+    renderer.add(surf.blit(rendered, rendered.get_rect(**position)), text, color)
 
-    turn = BLUE
-    nothingMoving = True
+def drawScores(surf: pygame.Surface, font: pygame.font, blueScore: int, redScore: int, renderer: DirtyRenderer):
+    drawText(surf, renderer, font, "Blue score: " + str(blueScore), BLUE, topleft = (0,0))
+    drawText(surf, renderer, font, "Red score: " + str(redScore), RED, topright = (SCREEN_WIDTH, 0))
 
+# the grenade and glue buttons along the bottom (needs a display mode set)
+def makePowerupButtons():
     buttonsX = []
     for i in range(NUM_BUTTONS):
         buttonsX.append(BUTTON_GAP * (1+i) + ICON_SIZE*i)
     grenadeButton = PowerupButton(pygame.Rect(buttonsX[0], BUTTON_Y, ICON_SIZE, ICON_SIZE), GRENADE, "buttons/grenade.png")
     glueButton = PowerupButton(pygame.Rect(buttonsX[1], BUTTON_Y, ICON_SIZE, ICON_SIZE), GLUE, "buttons/glue.png")
-    buttons = [grenadeButton, glueButton]
-    selectedButton, selectedButtonObj = None, None # first is for game loop, second is to set the button instance variable's selected = False once powerup is used
-    powerup = True
-    while 1:
-        gameLoop = False
+    return [grenadeButton, glueButton]
 
-        mouseX, mouseY = pygame.mouse.get_pos()
-        for event in pygame.event.get():
-            if event.type == pygame.locals.QUIT:
-                pygame.quit()
-                sys.exit()
-            
-            if event.type == pygame.locals.MOUSEBUTTONUP:
-                if playButton.hovered:
-                    gameLoop = True
-                if infoButton.hovered:
-                    infoDisplay(DISPLAYSURF, infoFont, clock, infoButton)
-        
-        playButton.hovered = playButton.rect.collidepoint(mouseX, mouseY)
-        infoButton.hovered = distance(infoButton.center[0], infoButton.center[1], mouseX, mouseY) <= ICON_SIZE/2
+# plays match until someone has won, then returns
+# ai is an optional soccer_ai.ShotSearch that takes that color's turns
+# the match runs on a MatchThread: this loop only draws its snapshots and sends it input
+def gameLoop(DISPLAYSURF: pygame.Surface, clock: pygame.time.Clock, displayFont: pygame.font, scoreFont: pygame.font, buttons: list,
+             renderer: DirtyRenderer, match: Match, ai=None):
+    renderer.invalidate() # coming from the menu
 
-        DISPLAYSURF.fill(GREEN)
-        DISPLAYSURF.blit(titleText, titleRect)
-        playButton.draw(DISPLAYSURF)
-        infoButton.draw(DISPLAYSURF)
-        pygame.display.update()
-        clock.tick(FPS)
+    selected = None # index into the match's players
+    startingX, startingY = 0,0
+    selectedButton, selectedButtonObj = None, None # first is for game loop, second is to set the button instance variable's selected = False once powerup is used
+    for button in buttons:
+        button.selected = False
+    shotPreview = ShotPreview()
+    profiler = match.profiler
+    if profiler:
+        # the simulation is timed separately, one "frame" per step, and shown under this one (and merged into its CSV)
+        match.profiler = profiler.sub = FrameProfiler(phases=SIM_PHASES)
+        profiler.skip() # don't count time spent in the menu
+    sim = MatchThread(match).start()
+    view = sim.view()
+    goals = view["blueScore"] + view["redScore"]
 
-        # reset game variables -----------
-        glues = []
-
-        scored = True # start at True to set inital object positions   
-        blueScore = 0
-        redScore = 0
-        win = False
-        while gameLoop:
-            # handle scored -----------------------
-            # let it run until everything stops moving, then reset
-            if scored:
-                stoppedMoving = True
-                for obj in objects:
-                    if obj.moving:
-                        stoppedMoving = False
-                        break
-                
-                if stoppedMoving and not win:
-                    ball = PhysicalObject(SCREEN_WIDTH/2, SCREEN_HEIGHT/2, BALL_MASS, BALL_SIZE, WHITE)
-                    objects = [ball]
-                    for spawn in SPAWNS:
-                        objects.append(Player(X_GAP + spawn[0], Y_GAP + spawn[1], BLUE))
-                        objects.append(Player(SCREEN_WIDTH - X_GAP - spawn[0], Y_GAP + spawn[1], RED))
-
-                    players = objects[1:]
-                    
-                    scored = False
-                    continue
+    try:
+        while 1:
+            # nothing moving, and nothing sent that the match hasn't applied yet
+            nothingMoving = not view["moving"] and view["applied"] == sim.sent
+
+            # computer's turn -----------------------
+            # the search runs on other processes, this only checks in on it once a frame
+            aiTurn = ai is not None and view["turn"] == ai.color
+            if ai is not None and not aiTurn:
+                ai.pending = None # its powerup scored, the shot that was to follow it isn't its to play anymore
+            if aiTurn and nothingMoving and not view["scored"] and not view["win"] and view["restState"] is not None:
+                if ai.pending is not None: # the powerup has settled
+                    ai.playPending(sim)
+                elif not ai.searching:
+                    ai.start(Match.fromState(view["restState"]))
+                else:
+                    shot = ai.poll()
+                    if shot is not None:
+                        ai.play(sim, shot)
+            if profiler: profiler.mark("ai")
 
             # handle input -----------------------
             # hold click & drag to aim
@@ -445,21 +1939,21 @@ def main():
                 if event.type == pygame.locals.QUIT:
                     pygame.quit()
                     sys.exit()
-                            
-                if event.type == pygame.locals.MOUSEBUTTONDOWN and nothingMoving:
+
+                if event.type == pygame.locals.MOUSEBUTTONDOWN and nothingMoving and not aiTurn:
                     # on click, check if anything's selected
                     # if not, check the cursor is on any player to mark it as selected
                     if selected is None:
-                        for player in players:
-                            if player.color == turn and distance(mouseX, mouseY, player.x, player.y) <= PLAYER_SIZE:
+                        for i, row in enumerate(view["players"]):
+                            x, y = view["pos"][row]
+                            if view["colors"][row] == view["turn"] and distance(mouseX, mouseY, x, y) <= PLAYER_SIZE:
                                 # distance from any player is within the player size = mouse is on the circle
                                 startingX, startingY = mouseX, mouseY
-                                player.hovered = True # mark to draw the circle around it
-                                selected = player
+                                selected = i
                                 break
-                    
+
                     # check for button click
-                    if powerup:
+                    if view["powerup"]:
                         for button in buttons:
                             if button.rect.collidepoint(mouseX, mouseY):
                                 if button.hovered: # click on hovered button = select/unselect the button
@@ -470,165 +1964,244 @@ def main():
                                         button.selected = True
                                         selectedButton = button.name
                                         selectedButtonObj = button
-                
+
                 if event.type == pygame.locals.MOUSEBUTTONUP:
                     # on unclick, check if anything's selected
                     # if so, check if the cursor's outside the player
-                    if powerup: # unnecessary (but just an extra check), as button cannot be clicked if powerup is False
-                        if selectedButton == GRENADE:
-                            if inField(mouseX, mouseY):
-                                spawnGrenade(objects, mouseX, mouseY)
-                                powerup = False
-                                selectedButtonObj.selected = False
-                                selectedButton, selectedButtonObj = None, None
-                        if selectedButton == GLUE:
-                            if inField(mouseX, mouseY):
-                                glues.append(FieldObject(mouseX, mouseY, GLUE_SIZE, YELLOW, lifetime = GLUE_LIFE))
-                                powerup = False
-                                selectedButtonObj.selected = False
-                                selectedButton, selectedButtonObj = None, None
-                    
+                    # (the same checks apply_powerup makes, since the match only gets it on its next step)
+                    if selectedButton is not None and view["powerup"] and not view["win"] and inField(mouseX, mouseY):
+                        sim.apply_powerup(selectedButton, mouseX, mouseY)
+                        selectedButtonObj.selected = False
+                        selectedButton, selectedButtonObj = None, None
+
                     # only handle player stuff if a powerup isn't selected
-                    if (selectedButton is None) and (selected) and (distance(mouseX, mouseY, selected.x, selected.y) > PLAYER_SIZE):
-                        # calculate drag distance, applying a slight tweak
-                        vel = pygame.math.Vector2(-(mouseX-startingX)/AIM_TWEAK, -(mouseY-startingY)/AIM_TWEAK)
-                        
-                        # limit velocity to MAX_VEL
-                        if vel.magnitude_squared() > MAX_VEL**2: # can use vel.clamp_magnitude_ip(), but is experimental
-                            vel.scale_to_length(MAX_VEL)
-                        
-                        selected.v = vel
-
-                        player.hovered = False
-                        selected = None
-
-                        # swap turns, new round
-                        if turn == RED:
-                            turn = BLUE
-                        else:
-                            turn = RED
-                        powerup = True                    
-                        for glue in glues:
-                            glue.lifetime -=1
-                            if glue.lifetime == 0:
-                                glues.remove(glue)
-
-                    # if not, unselect the thing
-                    else:
-                        player.hovered = False
-                        selected = None
-            
-            # update game -----------------------
-            fragsToRemove = []
-            nothingMoving = True
-            # check for wall collision
-            for obj in objects:
-                if obj.moving:
-                    nothingMoving = False
-                obj.handleWallCollision()
-                obj.updatePos(glues)
-
-                if (obj.type == "frag"):
-                    #if (not obj.moving):
-                    if (pygame.time.get_ticks()-obj.spawnTime > FRAG_LIFETIME):
-                        fragsToRemove.append(obj)
-            
-            for frag in fragsToRemove:
-                objects.remove(frag)
-            
-            pairs = [(a, b) for i, a in enumerate(objects) for b in objects[i+1:]]
-            for i in range(2):
-                for obj1, obj2 in pairs:
-                    if distance(obj1.x, obj1.y, obj2.x, obj2.y) <= obj1.size+obj2.size:
-                        obj1.handleCollision(obj2)
-            
+                    if (selectedButton is None) and (selected is not None):
+                        x, y = view["pos"][view["players"][selected]]
+                        if distance(mouseX, mouseY, x, y) > PLAYER_SIZE:
+                            sim.apply_shot(selected, *dragVelocity(startingX, startingY, mouseX, mouseY))
+
+                    # either way, unselect the player
+                    selected = None
+            if profiler: profiler.mark("input")
+
+            # latest state of the match ----------------------
+            view = sim.view()
+            if view["blueScore"] + view["redScore"] > goals:
+                goals = view["blueScore"] + view["redScore"]
+                scorer = view["scorer"]
+                if view["win"]:
+                    displayMessage = ("BLUE" if scorer == BLUE else "RED") + " WINS"
+                else:
+                    displayMessage = ("BLUE" if scorer == BLUE else "RED") + " SCORE"
+                displayColor = scorer
+                scoreTime = pygame.time.get_ticks()
+            nothingMoving = not view["moving"] and view["applied"] == sim.sent
+
             # display ----------------------------
-            DISPLAYSURF.fill(GREEN)
-            pygame.draw.rect(DISPLAYSURF, WHITE, pygame.Rect(X_GAP, Y_GAP, FIELD_WIDTH, FIELD_HEIGHT), 1) # field lines
-            pygame.draw.rect(DISPLAYSURF, BLUE, pygame.Rect(LEFT_GOAL_BACK, GOAL_TOP, GOAL_DEPTH, GOAL_HEIGHT), 1) # left goal
-            pygame.draw.rect(DISPLAYSURF, RED, pygame.Rect(X_GAP+FIELD_WIDTH, GOAL_TOP, GOAL_DEPTH, GOAL_HEIGHT), 1) # right goal
-            pygame.draw.line(DISPLAYSURF, GOLD, (X_GAP, GOAL_TOP), (X_GAP, GOAL_BOTTOM), 4) # left goal line
-            pygame.draw.line(DISPLAYSURF, GOLD, (X_GAP+FIELD_WIDTH, GOAL_TOP), (X_GAP+FIELD_WIDTH, GOAL_BOTTOM), 4) # right goal line
-            
+            # only what changed since last frame reaches the window
+            renderer.begin()
+            if profiler: profiler.mark("field")
+
             # draw objects ----------------
-            for glue in glues:
-                glue.draw(DISPLAYSURF)
-            for obj in objects:
-                obj.draw(DISPLAYSURF)
-            if selected:
-                pygame.draw.line(DISPLAYSURF, WHITE, (selected.x, selected.y), (mouseX, mouseY), SELECTED_THICKNESS)
-            
+            aiming = False
+            if selected is not None:
+                selectedX, selectedY = view["pos"][view["players"][selected]]
+                aiming = distance(mouseX, mouseY, selectedX, selectedY) > PLAYER_SIZE
+            if aiming and view["restState"] is not None: # where the shot would go, under the bodies
+                rollout = shotPreview.rollout(view["restState"], selected, *dragVelocity(startingX, startingY, mouseX, mouseY))
+                drawPreview(DISPLAYSURF, rollout, renderer)
+            drawSnapshot(DISPLAYSURF, view, renderer, None if selected is None else view["players"][selected])
+            if selected is not None:
+                aimRect = pygame.draw.line(DISPLAYSURF, WHITE, (selectedX, selectedY), (mouseX, mouseY), SELECTED_THICKNESS)
+                renderer.add(aimRect, "aim", int(selectedX), int(selectedY), mouseX, mouseY)
+            if profiler: profiler.mark("objects")
+
             # draw buttons ----------------
             for button in buttons:
-                button.color = turn
+                button.color = view["turn"]
                 button.hovered = button.rect.collidepoint(mouseX, mouseY)
-                button.draw(DISPLAYSURF, powerupAvailable=powerup)
-                # DISPLAYSURF.blit(buttonSurf, (button.rect.left, button.rect.top))
-            
+                renderer.add(button.draw(DISPLAYSURF, powerupAvailable=view["powerup"]), button.color, button.hovered, button.selected, view["powerup"])
+
             if selectedButton is not None:
-                buttonText = scoreFont.render(selectedButton, True, turn)
-                buttonTextRect = buttonText.get_rect(midbottom=(SCREEN_WIDTH/2, Y_GAP))
-                DISPLAYSURF.blit(buttonText, buttonTextRect)
-            if selectedButton == GRENADE:
-                alphaSurf = pygame.Surface((GRENADE_SIZE*2, GRENADE_SIZE*2), pygame.SRCALPHA) # new surface to draw the transparency
-                pygame.draw.circle(alphaSurf, TRANSPARENT_BLACK, (GRENADE_SIZE, GRENADE_SIZE), GRENADE_SIZE)
-                DISPLAYSURF.blit(alphaSurf, (mouseX-GRENADE_SIZE, mouseY-GRENADE_SIZE))
-            if selectedButton == GLUE:
-                alphaSurf = pygame.Surface((GLUE_SIZE*2, GLUE_SIZE*2), pygame.SRCALPHA)
-                pygame.draw.circle(alphaSurf, TRANSPARENT_YELLOW, (GLUE_SIZE, GLUE_SIZE), GLUE_SIZE)
-                DISPLAYSURF.blit(alphaSurf, (mouseX-GLUE_SIZE, mouseY-GLUE_SIZE))
-            
+                drawText(DISPLAYSURF, renderer, scoreFont, selectedButton, view["turn"], midbottom=(SCREEN_WIDTH/2, Y_GAP))
+                preview = previewSprite(selectedButton)
+                renderer.add(DISPLAYSURF.blit(preview, preview.get_rect(center=(mouseX, mouseY))), selectedButton)
+            if profiler: profiler.mark("buttons")
+
             # show turn ----------------
-            # blinks for a moment, fix:
-            # nothingMoving is true the frame when a player moves, even as the turn switches, so the new turn flashes before nothing shows bc there's movement
-            if nothingMoving and not scored:
-                if turn == BLUE:
-                    turnText = scoreFont.render("Blue Turn", True, BLUE)
-                if turn == RED:
-                    turnText = scoreFont.render("Red Turn", True, RED)
-                turnTextRect = turnText.get_rect(midtop=(SCREEN_WIDTH/2, 0))
-                DISPLAYSURF.blit(turnText, turnTextRect)
-                
-            # detect for scoring ----------------
-            if (ball.x < X_GAP and not scored):
-                redScore += 1
-                scored = True
-                if (redScore >= WIN_SCORE):
-                    displayText = displayFont.render("RED WINS", True, RED)
-                    win = True
-                else:
-                    displayText = displayFont.render("RED SCORE", True, RED)
-                displayTextRect = displayText.get_rect(center=(SCREEN_WIDTH/2, SCREEN_HEIGHT/2))
-                turn = BLUE
-                powerup = False
-                scoreTime = pygame.time.get_ticks()
-            if (ball.x > X_GAP+FIELD_WIDTH and not scored):
-                blueScore += 1
-                scored = True
-                if (blueScore >= WIN_SCORE):
-                    displayText = displayFont.render("BLUE WINS", True, BLUE)
-                    win = True
-                else:
-                    displayText = displayFont.render("BLUE SCORE", True, BLUE)
-                displayTextRect = displayText.get_rect(center=(SCREEN_WIDTH/2, SCREEN_HEIGHT/2))
-                turn = RED
-                powerup = False
-                scoreTime = pygame.time.get_ticks()
-            
-            if scored and pygame.time.get_ticks() - scoreTime < 5000: # keep SCORED text on 5 seconds after score
-                DISPLAYSURF.blit(displayText, displayTextRect)
-            if win and pygame.time.get_ticks() - scoreTime > 5000:
-                gameLoop = False # after win, leave after 5 seconds
+            # only once the last shot has reached the match, so the old turn doesn't flash up in between
+            if nothingMoving and not view["scored"]:
+                if view["turn"] == BLUE:
+                    drawText(DISPLAYSURF, renderer, scoreFont, "Blue Turn", BLUE, midtop=(SCREEN_WIDTH/2, 0))
+                if view["turn"] == RED:
+                    drawText(DISPLAYSURF, renderer, scoreFont, "Red Turn", RED, midtop=(SCREEN_WIDTH/2, 0))
+
+            if view["scored"] and pygame.time.get_ticks() - scoreTime < SCORE_DISPLAY_MS: # keep SCORED text on 5 seconds after score
+                drawText(DISPLAYSURF, renderer, displayFont, displayMessage, displayColor, center=(SCREEN_WIDTH/2, SCREEN_HEIGHT/2))
+            if view["win"] and pygame.time.get_ticks() - scoreTime > SCORE_DISPLAY_MS:
+                return # after win, leave after 5 seconds
 
             # show score for blue & red ----------------
-            DISPLAYSURF.blit(scoreFont.render("Blue score: " + str(blueScore), True, BLUE), (0,0))
-            redScoreText = scoreFont.render("Red score: " + str(redScore), True, RED)
-            redScoreRect = redScoreText.get_rect(topright = (SCREEN_WIDTH, 0))
-            DISPLAYSURF.blit(redScoreText, redScoreRect)
+            drawScores(DISPLAYSURF, scoreFont, view["blueScore"], view["redScore"], renderer)
+            if profiler:
+                profiler.draw(DISPLAYSURF, renderer)
+                match.profiler.draw(DISPLAYSURF, renderer, top=SCORE_SIZE + (len(profiler.overlay)+1)*PROFILE_SIZE)
+                profiler.mark("text")
 
             # update window
+            renderer.end()
+            if profiler:
+                profiler.mark("display")
+                profiler.endFrame()
+            # while players deliberate nothing changes until they do something, so wait for that instead of drawing
+            # (after a win, only until the message is done; never while a goal is playing out or the computer is thinking)
+            thinking = ai is not None and view["turn"] == ai.color and not view["win"]
+            previewing = aiming and shotPreview.busy
+            if IDLE and nothingMoving and not thinking and not previewing and (view["win"] or not view["scored"]):
+                waitForInput(SCORE_DISPLAY_MS - (pygame.time.get_ticks() - scoreTime) if view["win"] else None)
+            else:
+                clock.tick(FPS)
+            if profiler: profiler.skip() # waiting for the next frame isn't part of it
+    finally: # before anything else looks at the match, eg. to save a replay
+        sim.stop()
+        match.profiler = profiler
+        if profiler:
+            profiler.sub = None
+# plays back a replay: space pauses, left/right jump 5 seconds
+def replayLoop(DISPLAYSURF: pygame.Surface, clock: pygame.time.Clock, scoreFont: pygame.font, renderer: DirtyRenderer, player):
+    renderer.invalidate()
+    paused = False
+    accumulator = 0
+    while 1:
+        for event in pygame.event.get():
+            if event.type == pygame.locals.QUIT:
+                pygame.quit()
+                sys.exit()
+            if event.type == pygame.locals.KEYDOWN:
+                if event.key == pygame.locals.K_SPACE:
+                    paused = not paused
+                if event.key == pygame.locals.K_LEFT:
+                    player.seek(player.tick - 5*TICK_RATE)
+                if event.key == pygame.locals.K_RIGHT:
+                    player.seek(player.tick + 5*TICK_RATE)
+
+        ticks = 0
+        while not paused and accumulator >= TICK_MS and ticks < MAX_TICKS_PER_FRAME:
+            player.step()
+            accumulator -= TICK_MS
+            ticks += 1
+        accumulator = min(accumulator, TICK_MS)
+
+        renderer.begin()
+        drawMatch(DISPLAYSURF, player.match, renderer)
+        drawScores(DISPLAYSURF, scoreFont, player.match.blueScore, player.match.redScore, renderer)
+        timeText = "%.1f / %.1f s" % (player.tick/TICK_RATE, player.length/TICK_RATE)
+        drawText(DISPLAYSURF, renderer, scoreFont, timeText, WHITE, midbottom=(SCREEN_WIDTH/2, SCREEN_HEIGHT))
+        renderer.end()
+        accumulator += clock.tick(FPS)
+
+def parseArgs(args=None):
+    parser = argparse.ArgumentParser(description="Simple soccer game using Pygame")
+    parser.add_argument("--cpu", action="store_true", help="play against the computer (it plays red)")
+    parser.add_argument("--cpu-time", type=float, default=2.0, help="seconds the computer thinks per turn")
+    parser.add_argument("--cpu-workers", type=int, default=None, help="processes the computer thinks with (default: all cores)")
+    parser.add_argument("--record", metavar="FILE", help="save a replay of each match to FILE")
+    parser.add_argument("--replay", metavar="FILE", help="watch a saved replay instead of playing")
+    parser.add_argument("--log", metavar="DIR", help="append every match's events to the log in DIR (see soccer_log.py)")
+    parser.add_argument("--grenade", choices=GRENADE_MODES, default=GRENADE_MODE,
+                        help="how grenades work: fragment bodies, or one push to everything nearby")
+    parser.add_argument("--antialias", action="store_true", default=ANTIALIAS, help="smooth edges on bodies and glue")
+    parser.add_argument("--profile", action="store_true", default=bool(os.environ.get("SOCCER_PROFILE")),
+                        help="show how long each part of a frame takes (also on if SOCCER_PROFILE is set)")
+    parser.add_argument("--profile-csv", metavar="FILE", help="write each frame's timings to FILE (implies --profile)")
+    return parser.parse_args(args)
+
+def main(args=None):
+    global ANTIALIAS
+    args = parseArgs(args)
+    ANTIALIAS = args.antialias
+    ai = None
+    if args.cpu:
+        from soccer_ai import ShotSearch # imported here so soccer_ai can import this module
+        ai = ShotSearch(RED, args.cpu_time, args.cpu_workers)
+    log = None
+    if args.log:
+        from soccer_log import EventLog
+        log = EventLog(args.log)
+
+    try:
+        # initialize pygame
+        pygame.init()
+        DISPLAYSURF = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+        DISPLAYSURF.fill(GREEN)
+        pygame.display.set_caption("Soccer")
+        clock = pygame.time.Clock()
+        pygame.font.init()
+        # only what the menu needs is loaded up front, the rest the first time a match (or the info screen) is opened
+        displayFont = fontCache.get(DISPLAY_FONT, DISPLAY_SIZE)
+        titleFont = fontCache.get(TITLE_FONT, TITLE_SIZE)
+
+        titleText = textCache.render(titleFont, "Soccer", WHITE)
+        titleRect = titleText.get_rect(midtop=(SCREEN_WIDTH/2,0))
+        playButton = TextButton(GOLD, "Play", displayFont, WHITE)
+
+        infoButton = MenuButton(GOLD, (SCREEN_WIDTH-ICON_SIZE, SCREEN_HEIGHT-ICON_SIZE), "buttons/info.png")
+
+        buttons, renderer = None, None
+        profiler = None
+        if args.profile or args.profile_csv:
+            profiler = FrameProfiler(args.profile_csv, phases=tuple(phase for phase in PROFILE_PHASES if phase not in SIM_PHASES))
+
+        if args.replay:
+            from soccer_replay import ReplayPlayer, loadReplay
+            renderer = DirtyRenderer(DISPLAYSURF, drawField)
+            replayLoop(DISPLAYSURF, clock, fontCache.get(SCORE_FONT, SCORE_SIZE), renderer, ReplayPlayer(loadReplay(args.replay)))
+
+        while 1:
+            mouseX, mouseY = pygame.mouse.get_pos()
+            for event in pygame.event.get():
+                if event.type == pygame.locals.QUIT:
+                    pygame.quit()
+                    sys.exit()
+            
+                if event.type == pygame.locals.MOUSEBUTTONUP:
+                    if playButton.hovered:
+                        if buttons is None:
+                            buttons = makePowerupButtons()
+                        if renderer is None:
+                            renderer = DirtyRenderer(DISPLAYSURF, drawField) # the field is only drawn this once
+                        match = Match(args.grenade)
+                        match.profiler = profiler
+                        if log:
+                            log.attach(match)
+                        try:
+                            gameLoop(DISPLAYSURF, clock, displayFont, fontCache.get(SCORE_FONT, SCORE_SIZE), buttons, renderer, match, ai)
+                        finally: # even if the window was closed mid-match
+                            if args.record:
+                                from soccer_replay import saveReplay
+                                saveReplay(args.record, match)
+                            if profiler:
+                                profiler.flush()
+                            if log:
+                                log.flush()
+                    if infoButton.hovered:
+                        infoDisplay(DISPLAYSURF, fontCache.get(INFO_FONT, INFO_SIZE), clock, infoButton)
+        
+            playButton.hovered = playButton.rect.collidepoint(mouseX, mouseY)
+            infoButton.hovered = distance(infoButton.center[0], infoButton.center[1], mouseX, mouseY) <= ICON_SIZE/2
+
+            DISPLAYSURF.fill(GREEN)
+            DISPLAYSURF.blit(titleText, titleRect)
+            playButton.draw(DISPLAYSURF)
+            infoButton.draw(DISPLAYSURF)
             pygame.display.update()
             clock.tick(FPS)
+            waitForInput()
+    finally: # even if the window was closed, so the worker processes and the open log chunk go with it
+        if ai is not None:
+            ai.close()
+        if log:
+            log.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,180 @@
+import os, sys, time, random
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+import soccer
+
+# ---------------------- define constants
+AI_TIME_BUDGET = 2.0 # seconds of thinking per turn - more cores = more shots tried in that time
+AI_ANGLES = 24 # drag directions tried per player
+AI_POWERS = (0.4, 0.7, 1.0) # fractions of MAX_VEL tried per direction
+AI_CHUNK = 6 # shots per job sent to a worker
+AI_ROLLOUT_STEPS = 900 # give up simulating a shot after this many steps
+GOAL_REWARD = 10 # compared to ball position scores, which are around -1 to 1
+GRENADE_OFFSET = soccer.BALL_SIZE + soccer.FRAG_SIZE + 6 # grenades go just behind the ball
+
+
+# ---------------------- define functions
+def goalCenter(color: tuple):
+    # each team attacks the other team's goal: red scores on the left, blue on the right
+    if color == soccer.RED:
+        return soccer.LEFT_GOAL_BACK, (soccer.GOAL_TOP+soccer.GOAL_BOTTOM)/2
+    return soccer.RIGHT_GOAL_BACK, (soccer.GOAL_TOP+soccer.GOAL_BOTTOM)/2
+
+def opponent(color: tuple):
+    return soccer.BLUE if color == soccer.RED else soccer.RED
+
+# every (powerup, player, velocity) the AI considers this turn
+def candidateShots(state: dict):
+    color = state["turn"]
+    playerColors = [bodyColor for kind, bodyColor, _ in state["bodies"] if kind == "player"]
+    players = [i for i, playerColor in enumerate(playerColors) if playerColor == color]
+    ballX, ballY = next(pos for pos, (kind, _, _) in zip(state["pos"], state["bodies"]) if kind == "ball")
+
+    powerups = [(None, 0, 0)]
+    if state["powerup"]:
+        # grenades behind the ball (away from the goal being attacked), glue in front of our own goal
+        targetX, targetY = goalCenter(color)
+        away = soccer.angle(targetX, targetY, ballX, ballY)
+        for spread in (-0.5, 0, 0.5):
+            x, y = soccer.vectorToXY(GRENADE_OFFSET, away+spread)
+            powerups.append((soccer.GRENADE, ballX+x, ballY+y))
+        ownX, ownY = goalCenter(opponent(color))
+        powerups.append((soccer.GLUE, (ownX + soccer.SCREEN_WIDTH/2)/2, ownY))
+
+    shots = []
+    for kind, powerX, powerY in powerups:
+        if kind is not None and not soccer.inField(powerX, powerY):
+            continue
+        for playerIndex in players:
+            for a in range(AI_ANGLES):
+                for power in AI_POWERS:
+                    vx, vy = soccer.vectorToXY(soccer.MAX_VEL*power, 2*np.pi*a/AI_ANGLES)
+                    shots.append((kind, powerX, powerY, playerIndex, float(vx), float(vy)))
+    return shots
+
+# plays a shot out from the given state, higher is better for whoever's turn it is
+def scoreShot(state: dict, shot: tuple):
+    kind, powerX, powerY, playerIndex, vx, vy = shot
+    match = soccer.Match.fromState(state)
+    color = match.turn
+    if kind is not None:
+        match.apply_powerup(kind, powerX, powerY)
+        # fragments (or a blast) leave things moving, and apply_shot waits for everything to stop
+        scorer = rollout(match)
+        if scorer is not None:
+            return GOAL_REWARD if scorer == color else -GOAL_REWARD
+    if not match.apply_shot(playerIndex, vx, vy):
+        return -np.inf
+
+    scorer = rollout(match)
+    if scorer is not None:
+        return GOAL_REWARD if scorer == color else -GOAL_REWARD
+
+    # closer to their goal and further from ours is better
+    targetX, targetY = goalCenter(color)
+    ownX, ownY = goalCenter(opponent(color))
+    ballX, ballY = match.ball.x, match.ball.y
+    return (soccer.distance(ballX, ballY, ownX, ownY) - soccer.distance(ballX, ballY, targetX, targetY)) / soccer.FIELD_WIDTH
+
+# steps until everything stops moving (or AI_ROLLOUT_STEPS), returns whoever scored on the way (None if nobody did)
+def rollout(match):
+    for _ in range(AI_ROLLOUT_STEPS):
+        if not match.moving():
+            break
+        scorer = match.step()
+        if scorer is not None:
+            return scorer
+    return None
+
+# worker job: scores a batch of shots from the same state
+def scoreShots(state: dict, shots: list):
+    return [scoreShot(state, shot) for shot in shots]
+
+
+# ---------------------- define classes
+# searches for the best shot on worker processes, so the caller can keep drawing frames while it thinks
+class ShotSearch:
+    def __init__(self, color=soccer.RED, timeBudget=AI_TIME_BUDGET, workers=None):
+        self.color = color
+        self.timeBudget = timeBudget
+        self.workers = workers or os.cpu_count() or 1
+        # spawn, not fork, so workers don't inherit the parent's pygame window
+        self.pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        list(self.pool.map(int, range(self.workers))) # start every worker now instead of on the first turn
+        self.jobs = []
+        self.evaluated = 0 # shots scored during the last search
+        self.pending = None # (player index, vx, vy) held back until the powerup played before it has settled
+
+    @property
+    def searching(self):
+        return bool(self.jobs)
+
+    # starts thinking about the match's current position
+    def start(self, match):
+        state = match.getState()
+        shots = candidateShots(state)
+        random.Random(match.tick).shuffle(shots) # so running out of time still leaves an even sample
+        self.deadline = time.perf_counter() + self.timeBudget
+        self.best, self.bestScore = None, -np.inf
+        self.evaluated = 0
+        self.jobs = []
+        for i in range(0, len(shots), AI_CHUNK):
+            chunk = shots[i:i+AI_CHUNK]
+            self.jobs.append((self.pool.submit(scoreShots, state, chunk), chunk))
+
+    # call every frame while searching, returns the best shot once done (otherwise None)
+    def poll(self):
+        pending = []
+        for future, chunk in self.jobs:
+            if not future.done():
+                pending.append((future, chunk))
+                continue
+            for shot, score in zip(chunk, future.result()):
+                self.evaluated += 1
+                if score > self.bestScore:
+                    self.best, self.bestScore = shot, score
+        self.jobs = pending
+
+        outOfTime = time.perf_counter() > self.deadline and self.best is not None
+        if pending and not outOfTime:
+            return None
+        for future, _ in pending:
+            future.cancel()
+        self.jobs = []
+        return self.best
+
+    # applies a shot from poll() to the match (or a MatchThread); with a powerup, only the powerup goes now - the
+    # match refuses shots while anything is moving, so the shot waits in pending for playPending() once it has settled
+    def play(self, match, shot: tuple):
+        kind, powerX, powerY, playerIndex, vx, vy = shot
+        if kind is None:
+            return match.apply_shot(playerIndex, vx, vy)
+        self.pending = (playerIndex, vx, vy)
+        return match.apply_powerup(kind, powerX, powerY)
+
+    def playPending(self, match):
+        shot, self.pending = self.pending, None
+        return match.apply_shot(*shot)
+
+    def close(self):
+        for future, _ in self.jobs:
+            future.cancel()
+        self.jobs = []
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+# checks every kind of candidate from kickoff can be played: a powerup whose shots all score -inf is one the search
+# can never pick. exits with 1 if there is one
+def main():
+    state = soccer.Match().getState()
+    best = {}
+    for shot in candidateShots(state):
+        best[shot[0]] = max(best.get(shot[0], -np.inf), scoreShot(state, shot))
+    for kind, score in best.items():
+        print("%-8s best score %.3f" % (kind or "no powerup", score))
+    sys.exit(0 if all(np.isfinite(score) for score in best.values()) else 1)
+
+if __name__ == "__main__":
+    main()
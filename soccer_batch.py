@@ -0,0 +1,235 @@
+import time, argparse
+import numpy as np
+
+import soccer
+
+# ---------------------- define constants
+# every match has the same rows: the ball, the players (blue and red alternating, like Match.reset), then fragment slots
+BALL = 0
+PLAYERS = 6
+FIRST_FRAG = 1 + PLAYERS
+FRAG_SLOTS = soccer.FRAG_COUNT * 2 # per match, a grenade that doesn't fit is cut short
+GLUE_SLOTS = soccer.GLUE_LIFE + 1 # glues only last GLUE_LIFE rounds, one powerup a turn
+CONTACT_MARGIN = soccer.PLAYER_SIZE # pairs this much further apart than touching still go to the solver
+BLUE, RED = 0, 1 # turn and scores index
+GRENADE, GLUE = 0, 1 # powerup kinds
+
+# where reset puts the ball and players
+SPAWN_POS = np.array([(soccer.SCREEN_WIDTH/2, soccer.SCREEN_HEIGHT/2)] + [
+    pos for spawn in soccer.SPAWNS for pos in (
+        (soccer.X_GAP + spawn[0], soccer.Y_GAP + spawn[1]),
+        (soccer.SCREEN_WIDTH - soccer.X_GAP - spawn[0], soccer.Y_GAP + spawn[1]))])
+PLAYER_TEAM = np.arange(PLAYERS) % 2 # BLUE or RED, per player index
+FRAG_DIRECTIONS = np.stack(soccer.vectorToXY(soccer.FRAG_VEL, np.pi*np.arange(soccer.FRAG_COUNT)/(soccer.FRAG_COUNT/2)), 1)
+
+
+# ---------------------- define classes
+# many independent matches stepped together: every array has a leading match dimension, so one call to step()
+# advances all of them - same rules as Match (turns, powerups, glue, goals, winning), without the per-object Python
+# fragments live in fixed slots with an alive mask, and a match that's won starts over in place
+class BatchMatch:
+    def __init__(self, matches: int, fragSlots=FRAG_SLOTS, glueSlots=GLUE_SLOTS):
+        self.matches = matches
+        n = FIRST_FRAG + fragSlots
+        self.pos = np.zeros((matches, n, 2))
+        self.vel = np.zeros((matches, n, 2))
+        self.mass = np.array([soccer.BALL_MASS] + [soccer.PLAYER_MASS]*PLAYERS + [soccer.FRAG_MASS]*fragSlots, dtype=np.float64)
+        self.size = np.array([soccer.BALL_SIZE] + [soccer.PLAYER_SIZE]*PLAYERS + [soccer.FRAG_SIZE]*fragSlots, dtype=np.float64)
+        self.alive = np.ones((matches, n), dtype=bool) # fragment slots in use (the ball and players always are)
+        self.bodyMoving = np.zeros((matches, n), dtype=bool)
+        self.fragSpawn = np.zeros((matches, fragSlots), dtype=np.int64) # tick each fragment went off
+        self.glues = np.zeros((matches, glueSlots, 2)) # glue centers
+        self.glueLife = np.zeros((matches, glueSlots), dtype=np.int64) # rounds left, 0 = slot unused
+        self.scores = np.zeros((matches, 2), dtype=np.int64)
+        self.turn = np.zeros(matches, dtype=np.int64)
+        self.powerup = np.ones(matches, dtype=bool)
+        self.scored = np.zeros(matches, dtype=bool)
+        self.win = np.zeros(matches, dtype=bool)
+        self.tick = 0
+        self.finished = 0 # matches won so far, and by whom
+        self.wins = np.zeros(2, dtype=np.int64)
+
+        # every pair of rows within a match: between the ball and players, and the ones with a fragment in them
+        i, j = np.triu_indices(n, 1)
+        core = j < FIRST_FRAG
+        self.coreI, self.coreJ = i[core], j[core]
+        self.fragI, self.fragJ = i[~core], j[~core]
+        # the solver sees every match's rows one after another
+        self.flatMass = np.tile(self.mass, matches)
+        self.flatSize = np.tile(self.size, matches)
+        self.reset(np.ones(matches, dtype=bool), newMatch=True)
+
+    # ball and players back on their spawns, fragments gone; newMatch also clears scores, turn, powerups and glue
+    def reset(self, rows: np.ndarray, newMatch=False):
+        self.pos[rows, :FIRST_FRAG] = SPAWN_POS
+        self.vel[rows] = 0
+        self.alive[rows, FIRST_FRAG:] = False
+        self.bodyMoving[rows] = False
+        self.scored[rows] = False
+        if newMatch:
+            self.scores[rows] = 0
+            self.turn[rows] = BLUE
+            self.powerup[rows] = True
+            self.win[rows] = False
+            self.glueLife[rows] = 0
+
+    def moving(self):
+        return self.bodyMoving.any(1)
+
+    # launches player (0-5, an index into Match.players) in each match where rows is set and the shot is allowed
+    # returns where it was
+    def shoot(self, players: np.ndarray, vx: np.ndarray, vy: np.ndarray, rows=None):
+        allowed = ~self.win & ~self.scored & ~self.moving() & (PLAYER_TEAM[players] == self.turn)
+        if rows is not None:
+            allowed &= rows
+        matches = np.flatnonzero(allowed)
+        slots = 1 + players[matches]
+        vx, vy = vx[matches], vy[matches]
+        speed = np.hypot(vx, vy)
+        scale = np.where(speed > soccer.MAX_VEL, soccer.MAX_VEL / np.maximum(speed, 1e-12), 1) # clampVelocity
+        self.vel[matches, slots, 0], self.vel[matches, slots, 1] = vx*scale, vy*scale
+        self.bodyMoving[matches, slots] = speed > soccer.MOVING_SPEED
+
+        # swap turns, new round
+        self.turn[matches] ^= 1
+        self.powerup[matches] = True
+        used = self.glueLife[matches] > 0
+        self.glueLife[matches] -= used
+        return allowed
+
+    # uses this turn's powerup (GRENADE or GLUE per match) at (x, y) where rows is set and it's allowed, returns where it was
+    def usePowerup(self, kinds: np.ndarray, x: np.ndarray, y: np.ndarray, rows=None):
+        allowed = ~self.win & self.powerup & soccer.inField(x, y)
+        if rows is not None:
+            allowed &= rows
+
+        grenades = np.flatnonzero(allowed & (kinds == GRENADE))
+        if len(grenades):
+            # the first FRAG_COUNT free slots of each match
+            free = ~self.alive[grenades, FIRST_FRAG:]
+            slots = np.argsort(~free, axis=1, kind="stable")[:, :soccer.FRAG_COUNT]
+            spawned = np.take_along_axis(free, slots, 1)
+            m, k = np.nonzero(spawned)
+            match, slot = grenades[m], FIRST_FRAG + slots[m, k]
+            self.pos[match, slot] = np.stack((x[match], y[match]), 1)
+            self.vel[match, slot] = FRAG_DIRECTIONS[k]
+            self.alive[match, slot] = True
+            self.bodyMoving[match, slot] = True
+            self.fragSpawn[match, slot - FIRST_FRAG] = self.tick
+
+        glues = np.flatnonzero(allowed & (kinds == GLUE))
+        if len(glues):
+            slot = np.argmin(self.glueLife[glues] > 0, axis=1) # first unused slot
+            self.glues[glues, slot] = np.stack((x[glues], y[glues]), 1)
+            self.glueLife[glues, slot] = soccer.GLUE_LIFE
+
+        self.powerup[allowed] = False
+        return allowed
+
+    # advances every match one frame, returns per match who scored this step (BLUE, RED, or -1)
+    def step(self):
+        pos, vel = self.pos, self.vel
+        soccer.reflectWalls(pos, vel, self.size)
+        pos += vel
+
+        # glue friction, for any body touching a glue in its own match
+        inGlue = np.zeros(self.alive.shape, dtype=bool)
+        for slot in range(self.glueLife.shape[1]):
+            glue = self.glues[:, None, slot]
+            near = np.hypot(pos[..., 0] - glue[..., 0], pos[..., 1] - glue[..., 1]) <= soccer.GLUE_SIZE + self.size
+            inGlue |= near & (self.glueLife[:, None, slot] > 0)
+        vel *= np.where(inGlue, soccer.GLUE_FRICTION, soccer.FRICTION)[..., None]
+        self.bodyMoving = (np.hypot(vel[..., 0], vel[..., 1]) > soccer.MOVING_SPEED) & self.alive
+
+        self.tick += 1
+        frags = self.alive[:, FIRST_FRAG:]
+        expired = frags & (self.tick - self.fragSpawn > soccer.FRAG_LIFETIME)
+        frags &= ~expired
+        self.vel[:, FIRST_FRAG:][expired] = 0
+        self.bodyMoving[:, FIRST_FRAG:] &= ~expired
+
+        self.collide()
+        return self.detectGoals()
+
+    # one solver call for every match: pairs close enough to touch, as rows of the flattened (matches*bodies) arrays
+    # pairs with fragment slots are only looked at in matches that have fragments right now
+    def collide(self):
+        n = self.pos.shape[1]
+        first, second = [], []
+        withFrags = np.flatnonzero(self.alive[:, FIRST_FRAG:].any(1))
+        for matches, i, j in ((slice(None), self.coreI, self.coreJ), (withFrags, self.fragI, self.fragJ)):
+            pos, alive = self.pos[matches], self.alive[matches]
+            delta = pos[:, i] - pos[:, j]
+            near = alive[:, i] & alive[:, j]
+            near &= np.hypot(delta[..., 0], delta[..., 1]) < self.size[i] + self.size[j] + CONTACT_MARGIN
+            match, pair = np.nonzero(near)
+            match = np.arange(self.matches)[matches][match]
+            first.append(match*n + i[pair])
+            second.append(match*n + j[pair])
+        first, second = np.concatenate(first), np.concatenate(second)
+        if len(first):
+            soccer.resolveContacts(self.pos.reshape(-1, 2), self.vel.reshape(-1, 2), self.flatMass, self.flatSize, first, second)
+
+    def detectGoals(self):
+        ballX = self.pos[:, BALL, 0]
+        open = ~self.scored
+        redScores = open & (ballX < soccer.X_GAP)
+        blueScores = open & (ballX > soccer.X_GAP + soccer.FIELD_WIDTH)
+        scorer = np.full(self.matches, -1)
+        scorer[blueScores], scorer[redScores] = BLUE, RED
+        self.scores[redScores, RED] += 1
+        self.scores[blueScores, BLUE] += 1
+        self.turn[redScores], self.turn[blueScores] = BLUE, RED # whoever was scored on goes next
+
+        goal = redScores | blueScores
+        self.scored |= goal
+        self.win |= goal & (self.scores.max(1) >= soccer.WIN_SCORE)
+        self.powerup[goal] = False
+
+        # after a goal, once everything stops: back to the spawns, or a new match if that was the winner
+        settled = self.scored & ~goal & ~self.moving()
+        self.reset(settled & ~self.win)
+        won = settled & self.win
+        if won.any():
+            self.finished += int(won.sum())
+            self.wins += np.bincount(np.argmax(self.scores[won], 1), minlength=2)
+            self.reset(won, newMatch=True)
+        return scorer
+
+    # a simple bot for every match: whoever's turn it is kicks a random player of theirs at the ball, sometimes
+    # setting off a grenade behind it first
+    def playRandom(self, rng: np.random.Generator, grenadeChance=0.2):
+        ready = ~self.moving() & ~self.scored & ~self.win
+        players = 2*rng.integers(0, PLAYERS//2, self.matches) + self.turn
+        player = self.pos[np.arange(self.matches), 1 + players]
+        ball = self.pos[:, BALL]
+        direction = np.arctan2(ball[:, 1] - player[:, 1], ball[:, 0] - player[:, 0]) + rng.uniform(-0.2, 0.2, self.matches)
+        behind = ball - np.stack(soccer.vectorToXY(soccer.BALL_SIZE*3, direction), 1)
+        used = self.usePowerup(np.zeros(self.matches, dtype=np.int64), behind[:, 0], behind[:, 1],
+                               ready & (rng.random(self.matches) < grenadeChance))
+        speed = soccer.MAX_VEL * rng.uniform(0.6, 1, self.matches)
+        return self.shoot(players, *soccer.vectorToXY(speed, direction), ready & ~used) # shots wait for the fragments
+
+
+def parseArgs(args=None):
+    parser = argparse.ArgumentParser(description="Run many bot-vs-bot soccer matches at once and report throughput")
+    parser.add_argument("--matches", type=int, default=1000, help="matches stepped together")
+    parser.add_argument("--seconds", type=float, default=60, help="simulated seconds to run for")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(args)
+
+def main(args=None):
+    args = parseArgs(args)
+    batch = BatchMatch(args.matches)
+    rng = np.random.default_rng(args.seed)
+    steps = int(args.seconds * soccer.TICK_RATE)
+    start = time.perf_counter()
+    for _ in range(steps):
+        batch.playRandom(rng)
+        batch.step()
+    elapsed = time.perf_counter() - start
+    print("%d matches x %d steps in %.1f s: %.0f match-steps/s, %d matches finished (blue %d, red %d)" % (
+        args.matches, steps, elapsed, args.matches*steps/elapsed, batch.finished, *batch.wins))
+
+if __name__ == "__main__":
+    main()
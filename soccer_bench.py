@@ -0,0 +1,264 @@
+import os, sys, json, time, argparse, platform, subprocess
+from functools import partial
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy") # render offscreen, no window needed
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+import pygame
+import numpy as np
+
+import soccer
+
+# ---------------------- define constants
+BENCH_STEPS = 600 # physics steps per run (10 seconds of game time)
+BENCH_FRAMES = 300 # frames drawn per run
+BENCH_REPEATS = 3 # runs per scenario, the best is kept
+BENCH_THRESHOLD = 0.10 # fraction slower than the baseline that counts as a regression
+BACKENDS = ("auto",) + tuple(soccer.PHYSICS_BACKENDS)
+PARITY_TOLERANCE = 1e-9 # pixels (or pixels per step) the physics backends may differ by - they should agree exactly
+STRESS_BODIES = 300
+STRESS_SEED = 1
+# higher is better for all of these
+METRICS = ("steps_per_sec", "render_fps")
+
+
+# ---------------------- define scenarios
+# each one returns a fresh Match that's about to do something expensive
+def kickoff(physics=soccer.PHYSICS_BACKEND):
+    match = soccer.Match(physics=physics)
+    match.apply_shot(4, soccer.MAX_VEL, 0) # blue's middle player straight into the ball
+    return match
+
+# every player charging the ball, which sits on the left goal line
+def goalPileup(physics=soccer.PHYSICS_BACKEND):
+    match = soccer.Match(physics=physics)
+    ballX, ballY = soccer.X_GAP + soccer.BALL_SIZE, soccer.SCREEN_HEIGHT/2
+    match.ball.x, match.ball.y = ballX, ballY
+    for i, player in enumerate(match.players):
+        direction = np.pi * (i+0.5) / len(match.players) - np.pi/2 # fanned out on the field side
+        x, y = soccer.vectorToXY(soccer.PLAYER_SIZE*4 + i*4, direction)
+        player.x, player.y = ballX + x, ballY + y
+        player.v = soccer.vectorToXY(-soccer.MAX_VEL, direction)
+    return match
+
+def grenade(physics=soccer.PHYSICS_BACKEND):
+    match = soccer.Match(physics=physics)
+    match.apply_powerup(soccer.GRENADE, soccer.SCREEN_WIDTH/2 - soccer.BALL_SIZE*3, soccer.SCREEN_HEIGHT/2)
+    return match
+
+# the same grenade as one radial push, for comparing the two
+def impulseGrenade(physics=soccer.PHYSICS_BACKEND):
+    match = soccer.Match("impulse", physics)
+    match.apply_powerup(soccer.GRENADE, soccer.SCREEN_WIDTH/2 - soccer.BALL_SIZE*3, soccer.SCREEN_HEIGHT/2)
+    return match
+
+# more than the game allows in one turn, so spawned directly
+def fiveGrenades(physics=soccer.PHYSICS_BACKEND):
+    match = soccer.Match(physics=physics)
+    for x, y in ((0, 0), (-60, -60), (60, -60), (-60, 60), (60, 60)):
+        soccer.spawnGrenade(match.frags, match.world, soccer.SCREEN_WIDTH/2 + x, soccer.SCREEN_HEIGHT/2 + y, match.tick)
+    return match
+
+def overlappingGlue(physics=soccer.PHYSICS_BACKEND):
+    match = soccer.Match(physics=physics)
+    for x, y in ((-40, 0), (0, -30), (0, 30), (40, 0)):
+        match.glues.append(soccer.FieldObject(soccer.SCREEN_WIDTH/2 + x, soccer.SCREEN_HEIGHT/2 + y, soccer.GLUE_SIZE,
+                                              soccer.YELLOW, lifetime=soccer.GLUE_LIFE))
+    match.frictionField.build(match.glues)
+    match.apply_shot(4, soccer.MAX_VEL, 0)
+    return match
+
+# three grenades at once among bodies that have all gone to sleep: fragments waking them, reaching the walls, flying
+# into the goal mouth and crossing a glue's edge, all in the same steps
+def sleepingGrenades(physics=soccer.PHYSICS_BACKEND):
+    match = soccer.Match(physics=physics)
+    match.glues.append(soccer.FieldObject(soccer.SCREEN_WIDTH/2, soccer.SCREEN_HEIGHT/2 + 60, soccer.GLUE_SIZE,
+                                          soccer.YELLOW, lifetime=soccer.GLUE_LIFE))
+    match.frictionField.build(match.glues)
+    for _ in range(soccer.SLEEP_STEPS + 1): # nothing's moving at the start, so everything falls asleep
+        match.step()
+    for x, y in ((soccer.SCREEN_WIDTH/2 - 40, soccer.SCREEN_HEIGHT/2), (soccer.SCREEN_WIDTH/2 + 80, soccer.Y_GAP + 12),
+                 (soccer.X_GAP + 15, soccer.SCREEN_HEIGHT/2 - 20)):
+        soccer.spawnGrenade(match.frags, match.world, x, y, match.tick)
+    return match
+
+# hundreds of bodies of mixed sizes flying around the field
+def stressField(bodies=STRESS_BODIES, seed=STRESS_SEED, physics=soccer.PHYSICS_BACKEND):
+    match = soccer.Match(physics=physics)
+    rng = np.random.default_rng(seed)
+    for _ in range(bodies):
+        size = rng.choice((soccer.FRAG_SIZE, soccer.BALL_SIZE, soccer.PLAYER_SIZE))
+        x = rng.uniform(soccer.X_GAP + size, soccer.X_GAP + soccer.FIELD_WIDTH - size)
+        y = rng.uniform(soccer.Y_GAP + size, soccer.Y_GAP + soccer.FIELD_HEIGHT - size)
+        body = soccer.PhysicalObject(match.world, x, y, size, size, soccer.BLACK)
+        body.v = soccer.vectorToXY(rng.uniform(0, soccer.MAX_VEL), rng.uniform(0, 2*np.pi))
+    return match
+
+SCENARIOS = {
+    "kickoff": kickoff,
+    "goal_pileup": goalPileup,
+    "grenade": grenade,
+    "impulse_grenade": impulseGrenade,
+    "five_grenades": fiveGrenades,
+    "overlapping_glue": overlappingGlue,
+    "sleeping_grenades": sleepingGrenades,
+    "stress_field": stressField,
+}
+
+
+# ---------------------- define functions
+def machineInfo():
+    info = {
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pygame": pygame.version.ver,
+        "sdl": ".".join(map(str, pygame.get_sdl_version())),
+    }
+    try: # so results can be matched up with the code they came from
+        info["commit"] = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                        cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        info["commit"] = None
+    return info
+
+# steps per second, plus the median milliseconds per step spent in each physics phase and the mean solver passes per step
+def benchPhysics(scenario, steps=BENCH_STEPS, repeats=BENCH_REPEATS):
+    best = 0
+    for _ in range(repeats):
+        match = scenario()
+        start = time.perf_counter()
+        for _ in range(steps):
+            match.step()
+        best = max(best, steps / (time.perf_counter() - start))
+
+    # separate run for the breakdown so the profiler doesn't slow down the one above
+    match = scenario()
+    match.profiler = profiler = soccer.FrameProfiler(window=steps)
+    iterations = 0
+    for _ in range(steps):
+        profiler.skip()
+        match.step()
+        profiler.endFrame()
+        iterations += profiler.lastCounters["iterations"]
+    phases = {phase: round(profiler.percentiles(phase)[0], 4) for phase in ("physics", "pairs", "collisions")}
+    phases["iterations"] = round(iterations / steps, 2)
+    return best, phases
+
+# frames per second drawing the match offscreen the way gameLoop does (physics not included)
+def benchRender(scenario, surf: pygame.Surface, font: pygame.font, frames=BENCH_FRAMES, repeats=BENCH_REPEATS):
+    best = 0
+    for _ in range(repeats):
+        match = scenario()
+        renderer = soccer.DirtyRenderer(surf, soccer.drawField)
+        elapsed = 0
+        for _ in range(frames):
+            match.step()
+            start = time.perf_counter()
+            renderer.begin()
+            soccer.drawMatch(surf, match, renderer)
+            soccer.drawScores(surf, font, match.blueScore, match.redScore, renderer)
+            renderer.end()
+            elapsed += time.perf_counter() - start
+        best = max(best, frames / elapsed)
+    return best
+
+# plays scenario on the arrays and scalar physics backends, returns the biggest difference in any position or
+# velocity over the run (inf if they ended up with different bodies)
+def parity(scenario, steps=BENCH_STEPS):
+    runs = []
+    for physics in ("arrays", "scalar"):
+        match = scenario(physics=physics)
+        states = []
+        for _ in range(steps):
+            match.step()
+            world = match.world
+            states.append(np.concatenate((world.pos[:world.n], world.vel[:world.n]), 1))
+        runs.append(states)
+    worst = 0
+    for arrays, scalar in zip(*runs):
+        if arrays.shape != scalar.shape:
+            return np.inf
+        worst = max(worst, float(np.abs(arrays - scalar).max(initial=0)))
+    return worst
+
+def runBenchmarks(names, steps=BENCH_STEPS, frames=BENCH_FRAMES, repeats=BENCH_REPEATS, physics=soccer.PHYSICS_BACKEND):
+    pygame.init()
+    surf = pygame.display.set_mode((soccer.SCREEN_WIDTH, soccer.SCREEN_HEIGHT))
+    font = soccer.fontCache.get(soccer.SCORE_FONT, soccer.SCORE_SIZE)
+    results = {}
+    for name in names:
+        scenario = partial(SCENARIOS[name], physics=physics)
+        stepsPerSec, phases = benchPhysics(scenario, steps, repeats)
+        results[name] = {
+            "bodies": scenario().world.n,
+            "steps_per_sec": round(stepsPerSec, 1),
+            "render_fps": round(benchRender(scenario, surf, font, frames, repeats), 1),
+            "phase_ms": phases,
+        }
+        print("%-18s %4d bodies %9.1f steps/s %8.1f fps" % (name, results[name]["bodies"], results[name]["steps_per_sec"],
+                                                           results[name]["render_fps"]), file=sys.stderr)
+    pygame.quit()
+    settings = {"steps": steps, "frames": frames, "repeats": repeats, "backend": physics}
+    return {"machine": machineInfo(), "settings": settings, "scenarios": results}
+
+# returns a line for every metric more than threshold slower than in baseline
+def regressions(results: dict, baseline: dict, threshold=BENCH_THRESHOLD):
+    found = []
+    for name, metrics in results["scenarios"].items():
+        old = baseline["scenarios"].get(name)
+        if old is None:
+            continue
+        for metric in METRICS:
+            if metric in old and metrics[metric] < old[metric] * (1-threshold):
+                found.append("%s %s: %.1f, was %.1f (%+.0f%%)" % (name, metric, metrics[metric], old[metric],
+                                                                  100 * (metrics[metric]/old[metric] - 1)))
+    return found
+
+def parseArgs(args=None):
+    parser = argparse.ArgumentParser(description="Benchmark soccer.py physics and rendering")
+    parser.add_argument("scenarios", nargs="*", metavar="SCENARIO", help="scenarios to run (default: all of %s)" % ", ".join(SCENARIOS))
+    parser.add_argument("--steps", type=int, default=BENCH_STEPS, help="physics steps per run")
+    parser.add_argument("--frames", type=int, default=BENCH_FRAMES, help="frames drawn per run")
+    parser.add_argument("--repeats", type=int, default=BENCH_REPEATS, help="runs per scenario, the best is kept")
+    parser.add_argument("--output", "-o", metavar="FILE", help="write the results to FILE instead of stdout")
+    parser.add_argument("--baseline", metavar="FILE", help="results to compare against, exits with 1 on a regression")
+    parser.add_argument("--threshold", type=float, default=BENCH_THRESHOLD, help="how much slower counts as a regression (0.1 = 10%%)")
+    parser.add_argument("--backend", choices=BACKENDS, default=soccer.PHYSICS_BACKEND, help="physics backend to benchmark")
+    parser.add_argument("--parity", action="store_true",
+                        help="instead of timing, check the arrays and scalar backends play every scenario out the same (exits with 1 if not)")
+    args = parser.parse_args(args)
+    for name in args.scenarios:
+        if name not in SCENARIOS:
+            parser.error("unknown scenario %r (choose from %s)" % (name, ", ".join(SCENARIOS)))
+    return args
+
+def main(args=None):
+    args = parseArgs(args)
+    if args.parity:
+        failed = False
+        for name in args.scenarios or list(SCENARIOS):
+            worst = parity(SCENARIOS[name], args.steps)
+            failed |= worst > PARITY_TOLERANCE
+            print("%-18s max difference %.3g%s" % (name, worst, "" if worst <= PARITY_TOLERANCE else "  MISMATCH"))
+        sys.exit(1 if failed else 0)
+
+    results = runBenchmarks(args.scenarios or list(SCENARIOS), args.steps, args.frames, args.repeats, args.backend)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        found = regressions(results, baseline, args.threshold)
+        for line in found:
+            print("regression:", line, file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
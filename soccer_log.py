@@ -0,0 +1,378 @@
+import os, sys, csv, glob, time, random, struct, argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+import soccer
+from soccer_ai import goalCenter, opponent
+
+# ---------------------- define constants
+# a log is a directory of chunk files, only ever appended to: once a chunk reaches LOG_CHUNK_SIZE the next one is
+# started, so a crash loses at most the unflushed buffer and readers can go through it a chunk at a time
+# chunk layout (little endian):
+#   header   magic, version, tick rate, ticks between ball samples
+#   events   tick, kind, team, which (player index, powerup, grenade mode), x, y
+# every match starts with a "start" event, and may carry on into the next chunk
+MAGIC = b"SOCL"
+VERSION = 1
+HEADER = struct.Struct("<4sBHH")
+EVENT = struct.Struct("<IBBBff")
+EVENT_DTYPE = np.dtype([("tick", "<u4"), ("kind", "u1"), ("team", "u1"), ("which", "u1"), ("x", "<f4"), ("y", "<f4")])
+CHUNK_NAME = "events-%06d.log"
+
+EVENT_KINDS = ("start", "shot", "powerup", "goal", "turn", "rest", "ball", "win")
+START, SHOT, POWERUP, GOAL, TURN, REST, BALL, WIN = range(len(EVENT_KINDS))
+TEAMS = (soccer.BLUE, soccer.RED)
+NO_TEAM = 255
+POWERUPS = (soccer.GRENADE, soccer.GLUE)
+
+BALL_SAMPLE_TICKS = 6 # ball position logged every this many ticks (10 a second)
+LOG_CHUNK_SIZE = 4 << 20 # bytes per chunk file
+LOG_BUFFER_SIZE = 64 << 10 # bytes of events held before they're written out
+
+# what the analytics bin things into
+SHOT_POWER_BINS = 24 # over 0 to MAX_VEL
+REST_BIN_TICKS = 10
+REST_BINS = 120 # up to 20 seconds, anything longer goes in the last bin
+GOAL_BINS = 20 # across the goal mouth
+HEATMAP_CELL = 5 # pixels per heatmap cell, over the whole screen
+HEATMAP_SHAPE = (soccer.SCREEN_HEIGHT // HEATMAP_CELL, soccer.SCREEN_WIDTH // HEATMAP_CELL)
+
+SELFPLAY_MAX_TICKS = 30 * 60 * soccer.TICK_RATE # a match still going after half an hour is cut off
+SELFPLAY_GRENADE_CHANCE = 0.2
+SELFPLAY_GLUE_CHANCE = 0.1
+
+
+# ---------------------- define classes
+# writes a match's events to a log directory - give it to a match with attach(), and close() it when done
+# one writer per directory: it only appends to chunks it started itself
+class EventLog:
+    def __init__(self, directory: str, sampleTicks=BALL_SAMPLE_TICKS, chunkSize=LOG_CHUNK_SIZE, bufferSize=LOG_BUFFER_SIZE):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.sampleTicks = sampleTicks
+        self.chunkSize = chunkSize
+        self.bufferSize = bufferSize
+        existing = chunkFiles(directory)
+        self.chunk = int(os.path.basename(existing[-1])[7:13]) + 1 if existing else 0
+        self.file = None
+        self.written = 0 # bytes in the current chunk
+        self.buffer = bytearray()
+        self.moving = False # whether the match was moving after the last step
+
+    # starts logging a new match
+    def attach(self, match: soccer.Match):
+        match.log = self
+        self.moving = match.moving()
+        self.event(match.tick, "start", None, soccer.GRENADE_MODES.index(match.grenadeMode))
+
+    # team is a color (or None), which is a player index or powerup
+    def event(self, tick: int, kind: str, team=None, which=0, x=0.0, y=0.0):
+        if kind == "powerup":
+            which = POWERUPS.index(which)
+        self.buffer += EVENT.pack(tick, EVENT_KINDS.index(kind), NO_TEAM if team is None else TEAMS.index(team), which, x, y)
+        if len(self.buffer) >= self.bufferSize:
+            self.flush()
+
+    # called by the match after every step: samples the ball, and notes when a shot has played out
+    def stepped(self, match: soccer.Match):
+        if match.tick % self.sampleTicks == 0:
+            self.event(match.tick, "ball", None, 0, match.ball.x, match.ball.y)
+        moving = match.moving()
+        if self.moving and not moving:
+            self.event(match.tick, "rest", match.turn)
+        self.moving = moving
+
+    def flush(self):
+        if not self.buffer:
+            return
+        if self.file is None or self.written + len(self.buffer) > self.chunkSize:
+            if self.file is not None:
+                self.file.close()
+            self.file = open(os.path.join(self.directory, CHUNK_NAME % self.chunk), "ab")
+            self.chunk += 1
+            self.file.write(HEADER.pack(MAGIC, VERSION, soccer.TICK_RATE, self.sampleTicks))
+            self.written = HEADER.size
+        self.file.write(self.buffer)
+        self.file.flush()
+        self.written += len(self.buffer)
+        self.buffer.clear()
+
+    def close(self):
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+# running totals over any number of matches, only ever as big as its histograms - add() takes whole matches, and
+# two LogStats (eg. from different processes) can be merged
+class LogStats:
+    def __init__(self):
+        self.matches = 0
+        self.decided = 0 # matches someone won (the rest were cut off)
+        self.wins = np.zeros(2, dtype=np.int64)
+        self.goals = np.zeros(2, dtype=np.int64)
+        self.turns = 0
+        self.shots = np.zeros((2, SHOT_POWER_BINS), dtype=np.int64)
+        self.shotPower = np.zeros(2) # sum, for the mean
+        self.rests = np.zeros((2, REST_BINS), dtype=np.int64) # by the team that shot
+        self.restTicks = np.zeros(2)
+        self.powerups = np.zeros((2, len(POWERUPS)), dtype=np.int64) # uses, by team and kind
+        self.powerupMatches = np.zeros((2, len(POWERUPS)), dtype=np.int64) # decided matches a team used one in
+        self.powerupWins = np.zeros((2, len(POWERUPS)), dtype=np.int64) # ...and won
+        self.goalY = np.zeros((2, GOAL_BINS), dtype=np.int64) # where across the goal mouth, by scorer
+        self.heatmap = np.zeros(HEATMAP_SHAPE, dtype=np.int64) # ball samples
+
+    # events holds whole matches, each starting with its "start" event
+    def add(self, events: np.ndarray):
+        kind, team, tick = events["kind"], events["team"].astype(np.int64), events["tick"].astype(np.int64)
+        match = np.cumsum(kind == START) - 1
+        matches = int(match[-1]) + 1 if len(match) else 0
+        self.matches += matches
+        self.turns += int(np.count_nonzero(kind == TURN))
+
+        rows = np.flatnonzero(kind == SHOT)
+        power = np.hypot(events["x"][rows], events["y"][rows])
+        bins = np.minimum(power / soccer.MAX_VEL * SHOT_POWER_BINS, SHOT_POWER_BINS-1).astype(np.int64)
+        self.shots += np.bincount(team[rows]*SHOT_POWER_BINS + bins, minlength=2*SHOT_POWER_BINS).reshape(2, -1)
+        self.shotPower += np.bincount(team[rows], power, minlength=2)
+
+        # time to rest: from each shot to the first rest after it, in the same match
+        shots = rows
+        rows = np.flatnonzero(kind == REST)
+        previous = np.searchsorted(shots, rows) - 1
+        valid = previous >= 0
+        rows, previous = rows[valid], previous[valid]
+        previous, first = np.unique(previous, return_index=True)
+        rows, shots = rows[first], shots[previous]
+        same = match[rows] == match[shots]
+        rows, shots = rows[same], shots[same]
+        ticks = tick[rows] - tick[shots]
+        bins = np.minimum(ticks // REST_BIN_TICKS, REST_BINS-1)
+        self.rests += np.bincount(team[shots]*REST_BINS + bins, minlength=2*REST_BINS).reshape(2, -1)
+        self.restTicks += np.bincount(team[shots], ticks, minlength=2)
+
+        rows = np.flatnonzero(kind == GOAL)
+        self.goals += np.bincount(team[rows], minlength=2)
+        across = (events["y"][rows] - soccer.GOAL_TOP) / soccer.GOAL_HEIGHT
+        bins = np.clip(across * GOAL_BINS, 0, GOAL_BINS-1).astype(np.int64)
+        self.goalY += np.bincount(team[rows]*GOAL_BINS + bins, minlength=2*GOAL_BINS).reshape(2, -1)
+
+        # powerup win rates: of the decided matches a team used a powerup in, how many it won
+        winner = np.full(matches, -1)
+        rows = np.flatnonzero(kind == WIN)
+        winner[match[rows]] = team[rows]
+        decided = winner >= 0
+        self.decided += int(np.count_nonzero(decided))
+        self.wins += np.bincount(winner[decided], minlength=2)
+        rows = np.flatnonzero(kind == POWERUP)
+        self.powerups += np.bincount(team[rows]*len(POWERUPS) + events["which"][rows],
+                                     minlength=2*len(POWERUPS)).reshape(2, -1)
+        used = np.zeros((matches, 2, len(POWERUPS)), dtype=bool)
+        used[match[rows], team[rows], events["which"][rows]] = True
+        won = used & (winner[:, None, None] == np.arange(2)[:, None])
+        self.powerupMatches += used[decided].sum(0)
+        self.powerupWins += won[decided].sum(0)
+
+        rows = np.flatnonzero(kind == BALL)
+        x = np.clip(events["x"][rows] // HEATMAP_CELL, 0, HEATMAP_SHAPE[1]-1).astype(np.int64)
+        y = np.clip(events["y"][rows] // HEATMAP_CELL, 0, HEATMAP_SHAPE[0]-1).astype(np.int64)
+        self.heatmap += np.bincount(y*HEATMAP_SHAPE[1] + x, minlength=self.heatmap.size).reshape(HEATMAP_SHAPE)
+
+    def merge(self, other):
+        for key, value in vars(other).items():
+            setattr(self, key, getattr(self, key) + value)
+        return self
+
+    # columnar: every total as its own array
+    def saveNpz(self, path: str):
+        np.savez_compressed(path, **{key: np.asarray(value) for key, value in vars(self).items()},
+                            shotPowerEdges=np.linspace(0, soccer.MAX_VEL, SHOT_POWER_BINS+1),
+                            restEdges=np.arange(REST_BINS+1) * REST_BIN_TICKS / soccer.TICK_RATE,
+                            goalEdges=np.linspace(soccer.GOAL_TOP, soccer.GOAL_BOTTOM, GOAL_BINS+1))
+
+    # one row per team
+    def rows(self):
+        rows = []
+        for team, name in enumerate(("blue", "red")):
+            shots = self.shots[team].sum()
+            rests = self.rests[team].sum()
+            row = {
+                "team": name, "matches": self.matches, "wins": int(self.wins[team]),
+                "win_rate": self.wins[team] / max(self.decided, 1), "goals": int(self.goals[team]),
+                "turns_per_match": self.turns / max(self.matches, 1) / 2, "shots": int(shots),
+                "mean_shot_power": self.shotPower[team] / max(shots, 1) / soccer.MAX_VEL,
+                "mean_seconds_to_rest": self.restTicks[team] / max(rests, 1) / soccer.TICK_RATE,
+            }
+            for i, powerup in enumerate(POWERUPS):
+                powerup = powerup.lower()
+                row[powerup + "_uses"] = int(self.powerups[team, i])
+                row[powerup + "_matches"] = int(self.powerupMatches[team, i])
+                row[powerup + "_win_rate"] = self.powerupWins[team, i] / max(self.powerupMatches[team, i], 1)
+            rows.append(row)
+        return rows
+
+    def saveCsv(self, path: str):
+        rows = self.rows()
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+
+    # the ball heatmap over a drawing of the field, hotter = more time spent there (log scaled)
+    def saveHeatmap(self, path: str):
+        import pygame # only needed here, the rest runs without a display
+        heat = np.log1p(self.heatmap)
+        heat = heat / max(heat.max(), 1e-9)
+        rgba = np.zeros(HEATMAP_SHAPE + (4,), dtype=np.uint8)
+        rgba[..., 0] = 255
+        rgba[..., 1] = (255 * (1 - heat)).astype(np.uint8) # yellow to red
+        rgba[..., 3] = (220 * np.sqrt(heat)).astype(np.uint8)
+        overlay = pygame.image.frombuffer(rgba.tobytes(), HEATMAP_SHAPE[::-1], "RGBA")
+        surf = pygame.Surface((soccer.SCREEN_WIDTH, soccer.SCREEN_HEIGHT))
+        soccer.drawField(surf)
+        surf.blit(pygame.transform.smoothscale(overlay, (HEATMAP_SHAPE[1]*HEATMAP_CELL, HEATMAP_SHAPE[0]*HEATMAP_CELL)), (0, 0))
+        pygame.image.save(surf, path)
+
+
+# ---------------------- define functions
+def chunkFiles(directory: str):
+    return sorted(glob.glob(os.path.join(directory, CHUNK_NAME.replace("%06d", "[0-9]" * 6))))
+
+# every log directory under paths (a path that is one counts too)
+def logDirectories(paths: list):
+    for path in paths:
+        for directory, _, files in os.walk(path):
+            if any(name.startswith("events-") and name.endswith(".log") for name in files):
+                yield directory
+
+# a chunk's events, as a structured array - a record cut off by a crash is left out
+def readChunk(path: str):
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, tickRate, sampleTicks = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("%s is not a soccer event log (or from another version)" % path)
+    count = (len(data) - HEADER.size) // EVENT_DTYPE.itemsize
+    return np.frombuffer(data, EVENT_DTYPE, count, HEADER.size)
+
+# a log's events, a block of whole matches at a time: a match running off the end of a chunk is held back and
+# joined to the next one, so only about one chunk is ever in memory
+def matchBlocks(directory: str):
+    carry = np.zeros(0, EVENT_DTYPE)
+    for path in chunkFiles(directory):
+        events = np.concatenate((carry, readChunk(path)))
+        starts = np.flatnonzero(events["kind"] == START)
+        if len(starts) == 0: # one long match (or no start at all) - keep going
+            carry = events
+            continue
+        if starts[0] > 0: # events before the first start have no match to go with
+            events, starts = events[starts[0]:], starts - starts[0]
+        carry = events[starts[-1]:]
+        if starts[-1] > 0:
+            yield events[:starts[-1]]
+    if len(carry) and carry["kind"][0] == START:
+        yield carry
+
+def logStats(directory: str):
+    stats = LogStats()
+    for events in matchBlocks(directory):
+        stats.add(events)
+    return stats
+
+# totals over every log under paths, spread over workers processes
+def corpusStats(paths: list, workers=None):
+    directories = list(logDirectories(paths))
+    stats = LogStats()
+    if workers == 1:
+        for directory in directories:
+            stats.merge(logStats(directory))
+        return stats, len(directories)
+    with ProcessPoolExecutor(workers) as pool:
+        for result in pool.map(logStats, directories, chunksize=max(1, len(directories) // (4 * (workers or os.cpu_count())))):
+            stats.merge(result)
+    return stats, len(directories)
+
+# a simple bot for self-play: whoever's turn it is kicks whichever of their players is most nearly lined up behind the
+# ball (give or take some noise) at it, sometimes setting off a grenade behind it or putting glue in front of their own
+# goal first
+def playTurn(match: soccer.Match, rng: random.Random):
+    targetX, targetY = goalCenter(match.turn)
+    ball = match.ball
+    toGoal = soccer.angle(ball.x, ball.y, targetX, targetY)
+    best = None
+    for i, player in enumerate(match.players):
+        if player.color == match.turn:
+            direction = soccer.angle(player.x, player.y, ball.x, ball.y) + rng.uniform(-0.2, 0.2)
+            lined = np.cos(direction - toGoal) + rng.uniform(-0.5, 0.5)
+            if best is None or lined > best[0]:
+                best = (lined, i, direction)
+    _, playerIndex, direction = best
+    roll = rng.random()
+    if roll < SELFPLAY_GRENADE_CHANCE:
+        x, y = soccer.vectorToXY(soccer.BALL_SIZE*3, direction)
+        match.apply_powerup(soccer.GRENADE, ball.x - x, ball.y - y)
+        match.run_until_rest() # if it knocks the ball in, the shot below isn't allowed
+    elif roll < SELFPLAY_GRENADE_CHANCE + SELFPLAY_GLUE_CHANCE:
+        ownX, ownY = goalCenter(opponent(match.turn))
+        match.apply_powerup(soccer.GLUE, (ownX + soccer.SCREEN_WIDTH/2)/2, ownY)
+    match.apply_shot(playerIndex, *soccer.vectorToXY(soccer.MAX_VEL * rng.uniform(0.6, 1), direction))
+    match.run_until_rest()
+
+# plays matches bot against bot into the log at directory, returns the ticks simulated
+def selfplay(directory: str, matches: int, seed=0, grenadeMode=soccer.GRENADE_MODE, sampleTicks=BALL_SAMPLE_TICKS):
+    rng = random.Random(seed)
+    log = EventLog(directory, sampleTicks)
+    ticks = 0
+    try:
+        for _ in range(matches):
+            match = soccer.Match(grenadeMode)
+            log.attach(match)
+            while not match.win and match.tick < SELFPLAY_MAX_TICKS:
+                playTurn(match, rng)
+            ticks += match.tick
+    finally:
+        log.close()
+    return ticks
+
+def parseArgs(args=None):
+    parser = argparse.ArgumentParser(description="Match event logs: play bot matches into them, or sum them up into balance stats")
+    sub = parser.add_subparsers(dest="command", required=True)
+    playParser = sub.add_parser("selfplay", help="play bot matches, one log directory per worker under DIR")
+    playParser.add_argument("directory", metavar="DIR")
+    playParser.add_argument("--matches", type=int, default=100, help="matches per worker")
+    playParser.add_argument("--workers", type=int, default=os.cpu_count())
+    playParser.add_argument("--seed", type=int, default=0)
+    playParser.add_argument("--grenade", choices=soccer.GRENADE_MODES, default=soccer.GRENADE_MODE)
+    playParser.add_argument("--sample-ticks", type=int, default=BALL_SAMPLE_TICKS, help="ticks between ball position samples")
+    statsParser = sub.add_parser("stats", help="sum up every log under the given paths")
+    statsParser.add_argument("paths", nargs="+")
+    statsParser.add_argument("-o", "--output", default="stats", help="writes OUTPUT.npz, OUTPUT.csv and OUTPUT.png")
+    statsParser.add_argument("--workers", type=int, default=None, help="processes to read logs with (default: all cores)")
+    return parser.parse_args(args)
+
+def main(args=None):
+    args = parseArgs(args)
+    start = time.perf_counter()
+    if args.command == "selfplay":
+        directories = [os.path.join(args.directory, "selfplay-%d-%d" % (args.seed, worker)) for worker in range(args.workers)]
+        seeds = [args.seed * args.workers + worker for worker in range(args.workers)]
+        with ProcessPoolExecutor(args.workers) as pool:
+            ticks = sum(pool.map(selfplay, directories, [args.matches]*args.workers, seeds,
+                                 [args.grenade]*args.workers, [args.sample_ticks]*args.workers))
+        print("%d matches (%d ticks) in %.1f s" % (args.matches*args.workers, ticks, time.perf_counter() - start))
+        return
+
+    stats, logs = corpusStats(args.paths, args.workers)
+    if stats.matches == 0:
+        sys.exit("no matches found in " + ", ".join(args.paths))
+    stats.saveNpz(args.output + ".npz")
+    stats.saveCsv(args.output + ".csv")
+    stats.saveHeatmap(args.output + ".png")
+    print("%d matches from %d logs in %.1f s" % (stats.matches, logs, time.perf_counter() - start))
+    for row in stats.rows():
+        print("%-5s wins %5.1f%%  goals %d  mean shot %.0f%%  %.1f s to rest  grenade win rate %5.1f%%  glue win rate %5.1f%%" % (
+            row["team"], 100*row["win_rate"], row["goals"], 100*row["mean_shot_power"], row["mean_seconds_to_rest"],
+            100*row["grenade_win_rate"], 100*row["glue_win_rate"]))
+
+if __name__ == "__main__":
+    main()
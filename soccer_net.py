@@ -0,0 +1,479 @@
+import sys, math, time, random, struct, asyncio, argparse, threading
+from collections import deque
+import numpy as np
+
+import soccer
+from soccer_replay import BODY_KINDS, COLORS, POWERUPS
+
+# ---------------------- define constants
+# every message: payload length, type, then the payload (little endian)
+FRAME = struct.Struct("<HB")
+WELCOME, SNAPSHOT, SHOT, POWERUP, ACK = range(1, 6)
+WELCOME_MSG = struct.Struct("<BH") # your color, tick rate
+SHOT_MSG = struct.Struct("<Bff") # player index, velocity
+POWERUP_MSG = struct.Struct("<Bff") # powerup, position
+ACK_MSG = struct.Struct("<I") # newest snapshot decoded, 0 to ask for a full one
+# snapshot: sequence number, the one it's a delta against (0 = none), tick, scores, turn, flags, body count, changed rows
+SNAPSHOT_MSG = struct.Struct("<IIIBBBBHH")
+POWERUP_FLAG, SCORED_FLAG, WIN_FLAG, MOVING_FLAG, GLUES_FLAG = 1, 2, 4, 8, 16
+# bodies only go out if they changed: row, kind and color, position in fixed point
+ROW = np.dtype([("row", "<u2"), ("look", "u1"), ("x", "<u2"), ("y", "<u2")])
+GLUE_ROW = np.dtype([("x", "<u2"), ("y", "<u2"), ("lifetime", "i1")]) # after a count byte, only when the glues changed
+POS_SCALE = 8 # fixed point positions, in 1/8 pixels
+
+SNAPSHOT_INTERVAL = 2 # ticks between snapshots (30 a second)
+HEARTBEAT_TICKS = soccer.TICK_RATE # while nothing changes, one snapshot a second
+SNAPSHOT_HISTORY = 64 # unacknowledged snapshots kept per client to diff against
+END_TICKS = soccer.TICK_RATE # keep sending for a second after the win, then hang up
+INTERP_DELAY = 100 # milliseconds the client draws behind the newest snapshot, so it always has two to blend
+SIZES = {"ball": soccer.BALL_SIZE, "player": soccer.PLAYER_SIZE, "frag": soccer.FRAG_SIZE}
+PORT = 5005
+
+
+# ---------------------- define functions
+def encode(kind: int, payload=b""):
+    return FRAME.pack(len(payload), kind) + payload
+
+def clockMs():
+    return time.perf_counter() * 1000
+
+async def readMessage(reader: asyncio.StreamReader):
+    length, kind = FRAME.unpack(await reader.readexactly(FRAME.size))
+    return kind, await reader.readexactly(length)
+
+# what a client needs to see: (body looks, fixed point positions, glues, (scores, turn, flags))
+def quantize(match: soccer.Match):
+    looks = np.empty(match.world.n, dtype=np.uint8)
+    for row, obj in enumerate(match.objects):
+        kind = "ball" if obj is match.ball else "frag" if obj.type == "frag" else "player"
+        looks[row] = BODY_KINDS.index(kind)*len(COLORS) + COLORS.index(obj.color)
+    pos = np.clip(np.round(match.world.pos[:match.world.n] * POS_SCALE), 0, 65535).astype(np.uint16)
+    glues = tuple((round(glue.x*POS_SCALE), round(glue.y*POS_SCALE), glue.lifetime) for glue in match.glues)
+    flags = (match.powerup * POWERUP_FLAG | match.scored * SCORED_FLAG | match.win * WIN_FLAG
+             | match.moving() * MOVING_FLAG)
+    return looks, pos, glues, (match.blueScore, match.redScore, COLORS.index(match.turn), flags)
+
+def sameView(a: tuple, b: tuple):
+    return a[2:] == b[2:] and np.array_equal(a[0], b[0]) and np.array_equal(a[1], b[1])
+
+# one snapshot for a client, only holding what differs from base (a quantize() it has acknowledged, or None)
+def encodeSnapshot(seq: int, tick: int, baseSeq: int, base, current):
+    looks, pos, glues, (blueScore, redScore, turn, flags) = current
+    n = len(looks)
+    if base is None:
+        baseSeq, changed = 0, np.arange(n)
+    else:
+        baseLooks, basePos = base[:2]
+        m = min(n, len(baseLooks))
+        moved = (looks[:m] != baseLooks[:m]) | (pos[:m] != basePos[:m]).any(1)
+        changed = np.concatenate((np.flatnonzero(moved), np.arange(m, n)))
+
+    sendGlues = base is None or glues != base[2]
+    if sendGlues:
+        flags |= GLUES_FLAG
+    rows = np.empty(len(changed), dtype=ROW)
+    rows["row"], rows["look"] = changed, looks[changed]
+    rows["x"], rows["y"] = pos[changed, 0], pos[changed, 1]
+    data = [SNAPSHOT_MSG.pack(seq, baseSeq, tick, blueScore, redScore, turn, flags, n, len(changed)), rows.tobytes()]
+    if sendGlues:
+        data.append(bytes((len(glues),)) + np.array(list(glues), dtype=GLUE_ROW).tobytes())
+    return encode(SNAPSHOT, b"".join(data))
+
+def formatReport(report: dict):
+    return "match %d-%d after %.1f s: %.0f B/s out, %.0f B/s in (%.0f%% of sending full snapshots)" % (
+        report["blueScore"], report["redScore"], report["ticks"]/soccer.TICK_RATE, report["outPerSecond"],
+        report["inPerSecond"], 100*report["bytesOut"]/max(1, report["fullBytes"]))
+
+
+# ---------------------- define classes
+# rebuilds snapshots on the client side, keeping recent ones around as bases for the next deltas
+class SnapshotDecoder:
+    def __init__(self, history=SNAPSHOT_HISTORY):
+        self.snapshots = {} # seq -> state
+        self.history = history
+
+    # returns the snapshot as a dict, or None if its base is gone (then ack 0 to get a full one)
+    def decode(self, payload: bytes):
+        seq, baseSeq, tick, blueScore, redScore, turn, flags, n, changed = SNAPSHOT_MSG.unpack_from(payload)
+        offset = SNAPSHOT_MSG.size
+        if baseSeq == 0:
+            looks, pos, glues = np.zeros(n, dtype=np.uint8), np.zeros((n, 2), dtype=np.uint16), ()
+        elif baseSeq in self.snapshots:
+            base = self.snapshots[baseSeq]
+            looks, pos, glues = np.resize(base["looks"], n), np.resize(base["fixed"], (n, 2)), base["glueRows"]
+        else:
+            return None
+        rows = np.frombuffer(payload, dtype=ROW, count=changed, offset=offset)
+        offset += rows.nbytes
+        looks[rows["row"]] = rows["look"]
+        pos[rows["row"], 0], pos[rows["row"], 1] = rows["x"], rows["y"]
+        if flags & GLUES_FLAG:
+            count = payload[offset]
+            glues = tuple(map(tuple, np.frombuffer(payload, dtype=GLUE_ROW, count=count, offset=offset+1).tolist()))
+
+        kinds = [BODY_KINDS[look // len(COLORS)] for look in looks]
+        state = {
+            "seq": seq, "tick": tick, "blueScore": blueScore, "redScore": redScore, "turn": COLORS[turn],
+            "powerup": bool(flags & POWERUP_FLAG), "scored": bool(flags & SCORED_FLAG), "win": bool(flags & WIN_FLAG),
+            "moving": bool(flags & MOVING_FLAG), "looks": looks, "fixed": pos, "glueRows": glues, "kinds": kinds,
+            # the fields of a MatchThread snapshot that soccer.drawSnapshot draws from
+            "pos": pos / POS_SCALE, "size": np.array([SIZES[kind] for kind in kinds]),
+            "colors": [COLORS[look % len(COLORS)] for look in looks],
+            "players": [row for row, kind in enumerate(kinds) if kind == "player"],
+            "glues": [(x / POS_SCALE, y / POS_SCALE) for x, y, lifetime in glues],
+        }
+        self.snapshots[seq] = state
+        for old in [old for old in self.snapshots if old <= seq - self.history]:
+            del self.snapshots[old]
+        return state
+
+# one client's side of the conversation: which snapshot it last acknowledged, and what was sent since
+class ClientConnection:
+    def __init__(self, color: tuple, writer: asyncio.StreamWriter):
+        self.color = color
+        self.writer = writer
+        self.sent = {} # seq -> quantize() not yet acknowledged
+        self.baseSeq, self.base = 0, None
+
+    def acknowledge(self, seq: int):
+        if seq == 0: # lost track, start over from a full snapshot
+            self.baseSeq, self.base = 0, None
+        elif seq in self.sent and seq > self.baseSeq:
+            self.baseSeq, self.base = seq, self.sent[seq]
+            for old in [old for old in self.sent if old <= seq]:
+                del self.sent[old]
+
+# runs one match for two clients: owns the simulation, applies their commands, and streams snapshots to both
+class MatchServer:
+    def __init__(self, speed=1.0, maxTicks=None):
+        self.match = soccer.Match()
+        self.clients = []
+        self.speed = speed # simulated seconds per real second
+        self.maxTicks = maxTicks
+        self.seq = 0
+        self.bytesOut = 0
+        self.bytesIn = 0
+        self.fullBytes = 0 # what sending every body in every snapshot would have cost, for comparison
+        self.last, self.lastTick = None, 0 # last snapshot sent
+        self.finished = asyncio.Event()
+
+    def join(self, writer: asyncio.StreamWriter):
+        client = ClientConnection((soccer.BLUE, soccer.RED)[len(self.clients)], writer)
+        self.clients.append(client)
+        self.send(client, encode(WELCOME, WELCOME_MSG.pack(COLORS.index(client.color), soccer.TICK_RATE)))
+        return client
+
+    def send(self, client: ClientConnection, data: bytes):
+        if not client.writer.is_closing():
+            client.writer.write(data)
+            self.bytesOut += len(data)
+
+    # a command from a client, only on its own turn - anything malformed (wrong length, a velocity or position that
+    # isn't a finite number) is dropped, since it would end up in the authoritative state every snapshot comes from
+    def handle(self, client: ClientConnection, kind: int, payload: bytes):
+        self.bytesIn += FRAME.size + len(payload)
+        try:
+            if kind == ACK:
+                client.acknowledge(*ACK_MSG.unpack(payload))
+            elif client.color != self.match.turn:
+                return
+            elif kind == SHOT:
+                player, vx, vy = SHOT_MSG.unpack(payload)
+                if player < len(self.match.players) and math.isfinite(vx) and math.isfinite(vy):
+                    self.match.apply_shot(player, *soccer.clampVelocity(vx, vy))
+            elif kind == POWERUP:
+                powerup, x, y = POWERUP_MSG.unpack(payload)
+                if powerup < len(POWERUPS) and math.isfinite(x) and math.isfinite(y):
+                    self.match.apply_powerup(POWERUPS[powerup], x, y)
+        except struct.error:
+            return
+
+    def broadcast(self):
+        current = quantize(self.match)
+        self.fullBytes += len(self.clients) * len(encodeSnapshot(self.seq, self.match.tick, 0, None, current))
+        # nothing new to show (eg. waiting on a shot): only send now and then, so clients know the server's there
+        if self.last is not None and sameView(current, self.last) and self.match.tick - self.lastTick < HEARTBEAT_TICKS:
+            return
+        self.seq += 1
+        self.last, self.lastTick = current, self.match.tick
+        for client in self.clients:
+            self.send(client, encodeSnapshot(self.seq, self.match.tick, client.baseSeq, client.base, current))
+            client.sent[self.seq] = current
+            if len(client.sent) > SNAPSHOT_HISTORY: # not acknowledging, drop the oldest
+                del client.sent[min(client.sent)]
+
+    # fixed steps at TICK_RATE (times speed) until the match is won, a client leaves, or maxTicks
+    async def run(self):
+        self.started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        interval = 1 / (soccer.TICK_RATE * self.speed)
+        deadline = loop.time()
+        endTick = None
+        try:
+            while not self.finished.is_set():
+                self.match.step()
+                if self.match.tick % SNAPSHOT_INTERVAL == 0:
+                    self.broadcast()
+                if self.match.win and endTick is None:
+                    endTick = self.match.tick + END_TICKS
+                if self.match.tick == endTick or (self.maxTicks and self.match.tick >= self.maxTicks):
+                    break
+                deadline += interval
+                await asyncio.sleep(max(0, deadline - loop.time()))
+        finally:
+            self.elapsed = time.perf_counter() - self.started
+            for client in self.clients:
+                client.writer.close()
+            self.finished.set()
+
+    def report(self):
+        seconds = self.match.tick / soccer.TICK_RATE
+        return {
+            "ticks": self.match.tick, "blueScore": self.match.blueScore, "redScore": self.match.redScore,
+            "bytesOut": self.bytesOut, "bytesIn": self.bytesIn, "fullBytes": self.fullBytes,
+            "outPerSecond": self.bytesOut / seconds if seconds else 0, "inPerSecond": self.bytesIn / seconds if seconds else 0,
+        }
+
+# accepts connections and pairs them up into matches, reporting each match's traffic when it ends
+class Lobby:
+    def __init__(self, speed=1.0, maxTicks=None, report=print):
+        self.speed = speed
+        self.maxTicks = maxTicks
+        self.report = report
+        self.waiting = None
+        self.matches = []
+
+    async def connect(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        if self.waiting is None or self.waiting.finished.is_set(): # nobody waiting, or they left
+            self.waiting = server = MatchServer(self.speed, self.maxTicks)
+            self.matches.append(server)
+        else:
+            server, self.waiting = self.waiting, None
+        client = server.join(writer)
+        if len(server.clients) == 2:
+            asyncio.create_task(self.play(server))
+        try:
+            while not server.finished.is_set():
+                server.handle(client, *await readMessage(reader))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            server.finished.set() # the other player wins by default, nobody's told
+            if self.waiting is server: # left before anyone joined
+                self.waiting = None
+
+    async def play(self, server: MatchServer):
+        await server.run()
+        self.report(server.report())
+
+async def serve(host: str, port: int, speed=1.0, maxTicks=None):
+    lobby = Lobby(speed, maxTicks, lambda report: print(formatReport(report), flush=True))
+    server = await asyncio.start_server(lobby.connect, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+# ---------------------- scripted clients
+# plays by itself: on its turn, kicks a random player of its own at the ball, sometimes with a grenade behind it first
+async def scriptedClient(host: str, port: int, seed=0):
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    decoder = SnapshotDecoder()
+    shotTick = None
+    try:
+        kind, payload = await readMessage(reader)
+        color = COLORS[WELCOME_MSG.unpack(payload)[0]]
+        while True:
+            kind, payload = await readMessage(reader)
+            if kind != SNAPSHOT:
+                continue
+            state = decoder.decode(payload)
+            writer.write(encode(ACK, ACK_MSG.pack(state["seq"] if state else 0)))
+            if state is None or state["turn"] != color or state["moving"] or state["scored"] or state["win"]:
+                shotTick = None
+                continue
+            if shotTick is not None and state["tick"] - shotTick < soccer.TICK_RATE: # already shot, wait for it to show up
+                continue
+
+            players = state["players"]
+            ours = [i for i, row in enumerate(players) if state["colors"][row] == color]
+            ballX, ballY = state["pos"][state["kinds"].index("ball")]
+            player = rng.choice(ours)
+            x, y = state["pos"][players[player]]
+            direction = soccer.angle(x, y, ballX, ballY) + rng.uniform(-0.2, 0.2)
+            if state["powerup"] and rng.random() < 0.3:
+                gx, gy = soccer.vectorToXY(soccer.BALL_SIZE*3, direction + np.pi)
+                writer.write(encode(POWERUP, POWERUP_MSG.pack(POWERUPS.index(soccer.GRENADE), ballX - gx, ballY - gy)))
+            vx, vy = soccer.vectorToXY(soccer.MAX_VEL * rng.uniform(0.6, 1), direction)
+            writer.write(encode(SHOT, SHOT_MSG.pack(player, vx, vy)))
+            shotTick = state["tick"]
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass # match over
+    finally:
+        writer.close()
+
+# a server and pairs of scripted clients on localhost, returns each match's report
+async def runLocal(matches=1, speed=20.0, maxTicks=soccer.TICK_RATE*300, seed=0):
+    reports = []
+    lobby = Lobby(speed, maxTicks, reports.append)
+    server = await asyncio.start_server(lobby.connect, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        clients = []
+        for i in range(2*matches):
+            clients.append(asyncio.create_task(scriptedClient("127.0.0.1", port, seed + i)))
+            await asyncio.sleep(0) # connect in order, so clients 2k and 2k+1 share a match
+        await asyncio.gather(*clients)
+        while len(reports) < matches:
+            await asyncio.sleep(0.01)
+    return reports
+
+
+# ---------------------- pygame client
+# talks to the server on a background thread, leaving decoded snapshots in a queue for the drawing loop
+class RemoteMatch:
+    def __init__(self, host: str, port: int):
+        self.snapshots = deque(maxlen=SNAPSHOT_HISTORY) # (arrival in ms, state)
+        self.color = None
+        self.connected = threading.Event()
+        self.closed = False
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_until_complete, args=(self.receive(host, port),), daemon=True).start()
+        self.connected.wait()
+
+    async def receive(self, host: str, port: int):
+        decoder = SnapshotDecoder()
+        try:
+            reader, self.writer = await asyncio.open_connection(host, port)
+            kind, payload = await readMessage(reader)
+            self.color = COLORS[WELCOME_MSG.unpack(payload)[0]]
+            self.connected.set()
+            while True:
+                kind, payload = await readMessage(reader)
+                if kind == SNAPSHOT:
+                    state = decoder.decode(payload)
+                    self.writer.write(encode(ACK, ACK_MSG.pack(state["seq"] if state else 0)))
+                    if state:
+                        self.snapshots.append((clockMs(), state))
+        except (OSError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.closed = True
+            self.connected.set()
+
+    def send(self, data: bytes):
+        if not self.closed:
+            self.loop.call_soon_threadsafe(self.writer.write, data)
+
+    def shoot(self, player: int, vx: float, vy: float):
+        self.send(encode(SHOT, SHOT_MSG.pack(player, vx, vy)))
+
+    def powerup(self, kind: str, x: float, y: float):
+        self.send(encode(POWERUP, POWERUP_MSG.pack(POWERUPS.index(kind), x, y)))
+
+    # the newest snapshot, with positions blended between the two snapshots around INTERP_DELAY ago
+    def view(self, now: int):
+        if not self.snapshots:
+            return None
+        target = now - INTERP_DELAY
+        newest = self.snapshots[-1][1]
+        for (t0, a), (t1, b) in zip(list(self.snapshots)[-2::-1], list(self.snapshots)[::-1]):
+            if t0 <= target:
+                alpha = min(1, (target - t0) / max(1, t1 - t0))
+                n = min(len(a["looks"]), len(b["looks"]))
+                pos = b["pos"].copy()
+                same = a["looks"][:n] == b["looks"][:n] # a fragment moving into another's row isn't blended
+                pos[:n][same] = a["pos"][:n][same] + (b["pos"][:n][same] - a["pos"][:n][same]) * alpha
+                return dict(newest, pos=pos, kinds=b["kinds"], size=b["size"], colors=b["colors"], players=b["players"])
+        return self.snapshots[0][1] # only ones newer than that so far
+
+# the game window for a networked match: draws what the server sends and sends it the player's shots and powerups
+def clientLoop(host: str, port: int):
+    pygame = soccer.pygame
+    remote = RemoteMatch(host, port)
+    if remote.color is None:
+        sys.exit("couldn't connect to %s:%d" % (host, port))
+    pygame.init()
+    DISPLAYSURF = pygame.display.set_mode((soccer.SCREEN_WIDTH, soccer.SCREEN_HEIGHT))
+    pygame.display.set_caption("Soccer - playing " + ("blue" if remote.color == soccer.BLUE else "red"))
+    clock = pygame.time.Clock()
+    scoreFont = soccer.fontCache.get(soccer.SCORE_FONT, soccer.SCORE_SIZE)
+    displayFont = soccer.fontCache.get(soccer.DISPLAY_FONT, soccer.DISPLAY_SIZE)
+    buttons = soccer.makePowerupButtons()
+    renderer = soccer.DirtyRenderer(DISPLAYSURF, soccer.drawField)
+    selected, selectedButton = None, None
+    startingX, startingY = 0, 0
+
+    while not remote.closed or remote.snapshots:
+        state = remote.view(clockMs())
+        myTurn = state is not None and state["turn"] == remote.color and not state["moving"] and not state["scored"]
+        mouseX, mouseY = pygame.mouse.get_pos()
+        for event in pygame.event.get():
+            if event.type == pygame.locals.QUIT:
+                pygame.quit()
+                sys.exit()
+            if event.type == pygame.locals.MOUSEBUTTONDOWN and myTurn:
+                for button in buttons:
+                    if button.rect.collidepoint(mouseX, mouseY) and state["powerup"]:
+                        selectedButton = None if selectedButton == button.name else button.name
+                for row in state["players"]:
+                    x, y = state["pos"][row]
+                    if selectedButton is None and state["colors"][row] == remote.color and soccer.distance(mouseX, mouseY, x, y) <= soccer.PLAYER_SIZE:
+                        selected, startingX, startingY = row, mouseX, mouseY
+            if event.type == pygame.locals.MOUSEBUTTONUP and state is not None:
+                if selectedButton is not None and soccer.inField(mouseX, mouseY):
+                    remote.powerup(selectedButton, mouseX, mouseY)
+                    selectedButton = None
+                if selected is not None and soccer.distance(mouseX, mouseY, *state["pos"][selected]) > soccer.PLAYER_SIZE:
+                    remote.shoot(state["players"].index(selected), *soccer.dragVelocity(startingX, startingY, mouseX, mouseY))
+                selected = None
+
+        renderer.begin()
+        if state is not None:
+            soccer.drawSnapshot(DISPLAYSURF, state, renderer, selected)
+            for button in buttons:
+                button.color = state["turn"]
+                button.hovered = button.rect.collidepoint(mouseX, mouseY)
+                button.selected = button.name == selectedButton
+                renderer.add(button.draw(DISPLAYSURF, powerupAvailable=state["powerup"]), button.color, button.hovered, button.selected, state["powerup"])
+            if selectedButton is not None:
+                preview = soccer.previewSprite(selectedButton)
+                renderer.add(DISPLAYSURF.blit(preview, preview.get_rect(center=(mouseX, mouseY))), selectedButton)
+            if myTurn:
+                soccer.drawText(DISPLAYSURF, renderer, scoreFont, "Your Turn", remote.color, midtop=(soccer.SCREEN_WIDTH/2, 0))
+            if state["win"]:
+                message = ("BLUE" if state["blueScore"] > state["redScore"] else "RED") + " WINS"
+                soccer.drawText(DISPLAYSURF, renderer, displayFont, message, soccer.WHITE, center=(soccer.SCREEN_WIDTH/2, soccer.SCREEN_HEIGHT/2))
+            soccer.drawScores(DISPLAYSURF, scoreFont, state["blueScore"], state["redScore"], renderer)
+        renderer.end()
+        clock.tick(soccer.FPS)
+        if remote.closed and remote.snapshots and clockMs() - remote.snapshots[-1][0] > 3000: # done showing the end
+            break
+
+
+def parseArgs(args=None):
+    parser = argparse.ArgumentParser(description="Networked soccer: a match server, a client for it, or a local test")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serveParser = sub.add_parser("serve", help="host matches, pairing up clients as they connect")
+    serveParser.add_argument("--host", default="0.0.0.0")
+    serveParser.add_argument("--port", type=int, default=PORT)
+    clientParser = sub.add_parser("client", help="play on a server")
+    clientParser.add_argument("host", nargs="?", default="127.0.0.1")
+    clientParser.add_argument("--port", type=int, default=PORT)
+    localParser = sub.add_parser("local", help="play scripted clients against each other on localhost and report traffic")
+    localParser.add_argument("--matches", type=int, default=2)
+    localParser.add_argument("--speed", type=float, default=20.0, help="simulated seconds per real second")
+    localParser.add_argument("--max-seconds", type=float, default=300, help="simulated seconds before a match is cut off")
+    return parser.parse_args(args)
+
+def main(args=None):
+    args = parseArgs(args)
+    if args.command == "serve":
+        asyncio.run(serve(args.host, args.port))
+    elif args.command == "client":
+        clientLoop(args.host, args.port)
+    else:
+        reports = asyncio.run(runLocal(args.matches, args.speed, int(args.max_seconds*soccer.TICK_RATE)))
+        for report in reports:
+            print(formatReport(report))
+
+if __name__ == "__main__":
+    main()
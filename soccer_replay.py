@@ -0,0 +1,137 @@
+import struct
+from bisect import bisect_left
+import numpy as np
+
+import soccer
+
+# ---------------------- define constants
+# file layout (little endian):
+#   header   magic, version, tick rate
+#   state    tick, blue score, red score, turn, flags (powerup, scored, win, impulse grenades), body count, glue count
+#   bodies   kind, color, spawn tick, x, y, vx, vy, mass, size
+#   glues    x, y, lifetime
+#   inputs   tick, kind, then player/powerup, and two floats (velocity or position)
+#   end      tick of the last step, kind END
+MAGIC = b"SOCR"
+VERSION = 5 # bumped whenever the physics changes, since old inputs would play out differently
+HEADER = struct.Struct("<4sBH")
+STATE = struct.Struct("<IBBBBHH")
+BODY = struct.Struct("<BBI6d")
+GLUE = struct.Struct("<ddb")
+INPUT = struct.Struct("<IBBdd")
+END = 255
+
+BODY_KINDS = ("ball", "player", "frag")
+COLORS = (soccer.WHITE, soccer.BLUE, soccer.RED, soccer.BLACK)
+INPUT_KINDS = ("shot", "powerup")
+POWERUPS = (soccer.GRENADE, soccer.GLUE)
+
+KEYFRAME_INTERVAL = 120 # ticks between snapshots - a seek simulates at most this many steps
+
+
+# ---------------------- define functions
+def encodeReplay(initialState: dict, inputs: list, length: int):
+    state = initialState
+    flags = state["powerup"] | state["scored"] << 1 | state["win"] << 2 | (state.get("grenadeMode") == "impulse") << 3
+    data = [HEADER.pack(MAGIC, VERSION, soccer.TICK_RATE)]
+    data.append(STATE.pack(state["tick"], state["blueScore"], state["redScore"], COLORS.index(state["turn"]), flags,
+                           len(state["bodies"]), len(state["glues"])))
+    for (kind, color, spawnTick), pos, vel, mass, size in zip(state["bodies"], state["pos"], state["vel"], state["mass"], state["size"]):
+        data.append(BODY.pack(BODY_KINDS.index(kind), COLORS.index(color), spawnTick, *pos, *vel, mass, size))
+    for glue in state["glues"]:
+        data.append(GLUE.pack(*glue))
+    for tick, kind, a, b, c in inputs:
+        which = a if kind == "shot" else POWERUPS.index(a)
+        data.append(INPUT.pack(tick, INPUT_KINDS.index(kind), which, b, c))
+    data.append(INPUT.pack(length, END, 0, 0, 0))
+    return b"".join(data)
+
+# returns (initial state, inputs, length in ticks)
+def decodeReplay(data: bytes):
+    magic, version, tickRate = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not a soccer replay (or from another version)")
+    if tickRate != soccer.TICK_RATE:
+        raise ValueError("replay was recorded at %d ticks per second, this game runs at %d" % (tickRate, soccer.TICK_RATE))
+    offset = HEADER.size
+
+    tick, blueScore, redScore, turn, flags, bodyCount, glueCount = STATE.unpack_from(data, offset)
+    offset += STATE.size
+    bodies, rows = [], []
+    for _ in range(bodyCount):
+        kind, color, spawnTick, *row = BODY.unpack_from(data, offset)
+        offset += BODY.size
+        bodies.append((BODY_KINDS[kind], COLORS[color], spawnTick))
+        rows.append(row)
+    rows = np.array(rows, dtype=np.float64).reshape(bodyCount, 6)
+    glues = []
+    for _ in range(glueCount):
+        glues.append(GLUE.unpack_from(data, offset))
+        offset += GLUE.size
+    state = {
+        "pos": rows[:, 0:2].copy(), "vel": rows[:, 2:4].copy(), "mass": rows[:, 4].copy(), "size": rows[:, 5].copy(),
+        "moving": np.hypot(rows[:, 2], rows[:, 3]) > 0.001, "bodies": bodies, "glues": glues,
+        "blueScore": blueScore, "redScore": redScore, "turn": COLORS[turn],
+        "powerup": bool(flags & 1), "scored": bool(flags & 2), "win": bool(flags & 4), "tick": tick,
+        "grenadeMode": "impulse" if flags & 8 else "fragments",
+    }
+
+    inputs = []
+    while True:
+        tick, kind, which, b, c = INPUT.unpack_from(data, offset)
+        offset += INPUT.size
+        if kind == END:
+            return state, inputs, tick
+        if INPUT_KINDS[kind] == "shot":
+            inputs.append((tick, "shot", which, b, c))
+        else:
+            inputs.append((tick, "powerup", POWERUPS[which], b, c))
+
+def saveReplay(path: str, match: soccer.Match):
+    with open(path, "wb") as f:
+        f.write(encodeReplay(match.initialState, match.inputs, match.tick))
+
+def loadReplay(path: str):
+    with open(path, "rb") as f:
+        return decodeReplay(f.read())
+
+
+# ---------------------- define classes
+# plays a replay back, and can jump to any tick: it restores the closest earlier keyframe and simulates forward from there
+class ReplayPlayer:
+    def __init__(self, replay: tuple, keyframeInterval=KEYFRAME_INTERVAL):
+        self.initialState, self.inputs, self.length = replay
+        self.inputTicks = [input[0] for input in self.inputs]
+        self.keyframeInterval = keyframeInterval
+        self.start = self.initialState["tick"]
+        self.keyframes = {self.start: self.initialState} # filled in the first time each tick is simulated
+        self.restore(self.start)
+
+    @property
+    def tick(self):
+        return self.match.tick
+
+    def restore(self, tick: int):
+        self.match = soccer.Match.fromState(self.keyframes[tick])
+        self.nextInput = bisect_left(self.inputTicks, tick)
+
+    # applies this tick's inputs, then advances one step
+    def step(self):
+        tick = self.match.tick
+        if tick >= self.length:
+            return None
+        if (tick - self.start) % self.keyframeInterval == 0 and tick not in self.keyframes:
+            self.keyframes[tick] = self.match.getState()
+        while self.nextInput < len(self.inputs) and self.inputTicks[self.nextInput] <= tick:
+            self.match.applyInput(self.inputs[self.nextInput])
+            self.nextInput += 1
+        return self.match.step()
+
+    def seek(self, tick: int):
+        tick = min(max(tick, self.start), self.length)
+        keyframe = max(k for k in self.keyframes if k <= tick)
+        if tick < self.match.tick or keyframe > self.match.tick: # going back, or a keyframe gets us closer
+            self.restore(keyframe)
+        while self.match.tick < tick:
+            self.step()
+        return self.match